@@ -1,9 +1,5 @@
-import streamlit as st
-from src.analysis.market_breadth import MarketBreadthAnalyzer
-
-def main():
-    st.title("市场宽度分析工具")
-    # ... 其余代码 ...
-
-if __name__ == "__main__":
-    main() 
\ No newline at end of file
+# 兼容入口：streamlit run app.py 与 streamlit run src/app.py 相同
+from src.app import main
+
+if __name__ == "__main__":
+    main()
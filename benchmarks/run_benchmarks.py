@@ -0,0 +1,188 @@
+"""市场宽度性能基准
+
+用合成数据测量各阶段的耗时、峰值内存和吞吐量，结果保存为JSON，便于在不同提交之间比较：
+
+    python -m benchmarks.run_benchmarks                      # 快速规模
+    python -m benchmarks.run_benchmarks --preset full        # 30/500/2000/5000 只 × 180/1000/5000 天
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_universe, FakeDataFetcher, INDEX_SYMBOL
+from src.analysis.market_breadth import MarketBreadth
+from src.analysis.market_analysis import MarketAnalysis
+from src.data.data_storage import DataStorage
+from src.data.signal_store import SignalStore
+
+PRESETS = {
+    'quick': {'symbols': [30, 500], 'days': [180, 1000]},
+    'full': {'symbols': [30, 500, 2000, 5000], 'days': [180, 1000, 5000]}
+}
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def measure(fn: Callable, repeat: int = 3) -> Dict:
+    """多次运行取最短耗时，再单独运行一次用 tracemalloc 记录峰值内存"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'seconds': min(times), 'peak_mb': peak / 1024 / 1024, 'result': result}
+
+
+def run_case(n_symbols: int, n_days: int, repeat: int, seed: int) -> List[Dict]:
+    """对一个规模运行所有阶段"""
+    started = time.perf_counter()
+    universe = generate_universe(n_symbols, n_days, seed=seed)
+    generate_seconds = time.perf_counter() - started
+
+    fetcher = FakeDataFetcher(universe)
+    symbols = fetcher.get_components()
+    cache_dir = tempfile.mkdtemp(prefix="breadth_bench_")
+    market_breadth = MarketBreadth(fetcher, DataStorage(cache_dir), SignalStore(os.path.join(cache_dir, "signals")))
+    index_df = fetcher.get_stock_data(INDEX_SYMBOL, n_days)
+    index_df.index = index_df.index.tz_localize(None)
+    analysis = MarketAnalysis()
+
+    stages = {
+        'historical_breadth_ma21': lambda: market_breadth.calculate_historical_breadth(
+            symbols, 21, n_days, incremental=False, use_cache=False),
+        'historical_breadth_ma127': lambda: market_breadth.calculate_historical_breadth(
+            symbols, 127, n_days, incremental=False, use_cache=False),
+        'historical_bullish_alignment': lambda: market_breadth.calculate_historical_bullish_alignment(
+            symbols, n_days, use_cache=False),
+        'sector_breadth_ma21': lambda: market_breadth.calculate_sector_breadth(
+            symbols, 21, n_days, use_cache=False),
+    }
+
+    results = [{'stage': 'generate', 'seconds': generate_seconds, 'peak_mb': None}]
+    outputs = {}
+    for stage, fn in stages.items():
+        measured = measure(fn, repeat)
+        outputs[stage] = measured.pop('result')
+        results.append({'stage': stage, **measured})
+
+    breadth_df = outputs['historical_breadth_ma21']
+    storage = market_breadth.data_storage
+    measured = measure(lambda: storage.save_data(breadth_df, 21, n_symbols, n_days), repeat)
+    measured.pop('result')
+    results.append({'stage': 'save_data', **measured})
+    measured = measure(lambda: storage.load_data(21, n_symbols, n_days), repeat)
+    measured.pop('result')
+    results.append({'stage': 'load_data', **measured})
+    measured = measure(lambda: analysis.analyze_market_condition(breadth_df, index_df), repeat)
+    measured.pop('result')
+    results.append({'stage': 'analyze_market_condition', **measured})
+
+    # 吞吐量按 股票数×交易日数 计算
+    for row in results:
+        row.update({'symbols': n_symbols, 'days': n_days})
+        row['throughput'] = n_symbols * n_days / row['seconds'] if row['seconds'] > 0 else None
+    return results
+
+
+def print_results(results: List[Dict], baseline: Dict = None):
+    baseline_times = {}
+    if baseline:
+        baseline_times = {(row['symbols'], row['days'], row['stage']): row['seconds'] for row in baseline['results']}
+
+    header = f"{'symbols':>8} {'days':>6} {'stage':<30} {'seconds':>10} {'peak MB':>9} {'sym·days/s':>12}"
+    if baseline_times:
+        header += f" {'vs base':>8}"
+    print(header)
+    for row in results:
+        line = (f"{row['symbols']:>8} {row['days']:>6} {row['stage']:<30} {row['seconds']:>10.4f} "
+                f"{row['peak_mb'] if row['peak_mb'] is not None else float('nan'):>9.1f} "
+                f"{row['throughput'] or float('nan'):>12.3g}")
+        base = baseline_times.get((row['symbols'], row['days'], row['stage']))
+        if base:
+            line += f" {row['seconds'] / base:>7.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="市场宽度性能基准")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default='quick', help="测试规模")
+    parser.add_argument("--symbols", type=int, nargs='+', help="股票数量，覆盖 preset")
+    parser.add_argument("--days", type=int, nargs='+', help="交易日数量，覆盖 preset")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段的计时次数，取最短耗时")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument("--output", help="结果JSON路径，默认 benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="用于对比的基准结果JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    symbol_counts = args.symbols or PRESETS[args.preset]['symbols']
+    day_counts = args.days or PRESETS[args.preset]['days']
+
+    results = []
+    for n_symbols in symbol_counts:
+        for n_days in day_counts:
+            print(f"运行 {n_symbols} 只股票 × {n_days} 天 ...", file=sys.stderr)
+            results.extend(run_case(n_symbols, n_days, args.repeat, args.seed))
+
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'results': results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f"结果已保存到 {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
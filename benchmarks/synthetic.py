@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+MARKET_TZ = 'America/New_York'
+INDEX_SYMBOL = "^SYN"
+SECTORS = ['Communication Services', 'Consumer Discretionary', 'Consumer Staples', 'Energy', 'Financials',
+           'Health Care', 'Industrials', 'Information Technology', 'Materials', 'Real Estate', 'Utilities']
+# 在回溯期之外额外生成的K线数，覆盖最长均线周期
+WARMUP_BARS = 300
+
+
+def generate_universe(n_symbols: int, n_days: int, seed: int = 0, late_listing: float = 0.02) -> Dict[str, pd.DataFrame]:
+    """生成确定性的合成OHLCV数据，返回 {股票代码: DataFrame}
+
+    收益率由共同的市场因子和个股噪声组成，使市场宽度有明显的起伏；
+    late_listing 比例的股票在中途上市，用于覆盖数据不齐的情况。
+    """
+    rng = np.random.default_rng(seed)
+    n_bars = n_days + WARMUP_BARS
+    dates = pd.bdate_range(end=pd.Timestamp.now(tz=MARKET_TZ).normalize(), periods=n_bars)
+
+    # 市场因子带有缓慢变化的趋势，个股有各自的beta和波动率
+    trend = np.sin(np.linspace(0, 6 * np.pi, n_bars)) * 0.001
+    market = trend + rng.normal(0, 0.01, n_bars)
+    beta = rng.uniform(0.5, 1.5, n_symbols)
+    vol = rng.uniform(0.01, 0.03, n_symbols)
+    returns = market[:, None] * beta[None, :] + rng.normal(0, 1, (n_bars, n_symbols)) * vol[None, :]
+    close = 50 * np.exp(np.cumsum(returns, axis=0)) * rng.uniform(0.2, 5, n_symbols)[None, :]
+
+    open_ = close * (1 + rng.normal(0, 0.003, close.shape))
+    spread = np.abs(rng.normal(0, 0.01, close.shape))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.integers(100_000, 10_000_000, close.shape).astype(np.float64)
+
+    listing = np.zeros(n_symbols, dtype=int)
+    late = rng.random(n_symbols) < late_listing
+    listing[late] = rng.integers(1, n_bars - 1, late.sum())
+
+    universe = {}
+    for i in range(n_symbols):
+        start = listing[i]
+        universe[f"S{i:05d}"] = pd.DataFrame({
+            'Open': open_[start:, i],
+            'High': high[start:, i],
+            'Low': low[start:, i],
+            'Close': close[start:, i],
+            'Volume': volume[start:, i]
+        }, index=dates[start:])
+
+    index_close = 100 * np.exp(np.cumsum(returns.mean(axis=1)))
+    universe[INDEX_SYMBOL] = pd.DataFrame({
+        'Open': index_close,
+        'High': index_close,
+        'Low': index_close,
+        'Close': index_close,
+        'Volume': 0.0
+    }, index=dates)
+    return universe
+
+
+class SyntheticUniverse:
+    """提供与 UniverseManager 相同查询接口的合成成分股表，行业按代码轮流分配"""
+
+    def __init__(self, symbols: List[str]):
+        self.symbols = [symbol for symbol in symbols if symbol != INDEX_SYMBOL]
+
+    def get_members(self, index_name: str = 'SP500') -> List[str]:
+        return list(self.symbols)
+
+    def get_sectors(self, index_name: str = 'SP500') -> Dict[str, str]:
+        return {symbol: SECTORS[i % len(SECTORS)] for i, symbol in enumerate(self.symbols)}
+
+
+class FakeDataFetcher:
+    """提供与 DataFetcher 相同接口的合成数据获取器，不访问网络"""
+
+    def __init__(self, stocks_data: Dict[str, pd.DataFrame], config: Dict = None):
+        self.stocks_data = stocks_data
+        self.universe = SyntheticUniverse(list(stocks_data))
+        self.config = config or {'moving_averages': [21, 63, 127]}
+        self.request_count = 0
+
+    def _get_start_date(self, period: int) -> pd.Timestamp:
+        """与 DataFetcher 相同：获取2倍周期的自然日"""
+        return (pd.Timestamp.now(tz=MARKET_TZ) - pd.Timedelta(days=period * 2)).normalize()
+
+    def get_stock_data(self, symbol: str, period: int = 21) -> pd.DataFrame:
+        self.request_count += 1
+        data = self.stocks_data.get(symbol)
+        if data is None:
+            return pd.DataFrame()
+        return data[data.index >= self._get_start_date(period)].copy()
+
+    def get_stock_data_bulk(self, symbols: List[str], period: int = 21, chunk_size: int = None,
+                            max_workers: int = None, progress_callback=None) -> Dict[str, pd.DataFrame]:
+        self.request_count += 1
+        start_date = self._get_start_date(period)
+        results = {}
+        for symbol in symbols:
+            data = self.stocks_data.get(symbol)
+            if data is not None:
+                data = data[data.index >= start_date]
+                if not data.empty:
+                    results[symbol] = data
+        return results
+
+    def get_components(self, index_name: str = 'SP500') -> List[str]:
+        return self.universe.get_members(index_name)
@@ -1,3 +1,21 @@
-from .market_breadth import MarketBreadth
+import importlib
 
-__all__ = ['MarketBreadth']
+# 按需导入（PEP 562），只用到分析规则或回测时不会加载行情获取模块
+_EXPORTS = {
+    'MarketBreadth': '.market_breadth',
+    'BreadthEngine': '.breadth_engine'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
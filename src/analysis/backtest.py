@@ -0,0 +1,173 @@
+import pandas as pd
+import numpy as np
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+# 每个计算块中 单元格数×交易日数 的上限，控制 参数×日期 矩阵的内存
+BLOCK_SIZE = 4_000_000
+
+
+def _threshold_events(breadth: np.ndarray, thresholds: np.ndarray, below: bool) -> np.ndarray:
+    """每个阈值截至每个日期最近一次触发的下标（未触发为-1），返回 阈值×日期 矩阵"""
+    days = np.arange(len(breadth))
+    with np.errstate(invalid='ignore'):
+        hit = breadth[None, :] <= thresholds[:, None] if below else breadth[None, :] >= thresholds[:, None]
+    return np.maximum.accumulate(np.where(hit, days[None, :], -1), axis=1)
+
+
+def backtest_block(breadth: np.ndarray, closes: np.ndarray, entries: np.ndarray, exits: np.ndarray,
+                   horizons: List[int]) -> Dict[str, np.ndarray]:
+    """对一个均线周期的 入场阈值×出场阈值 网格一次完成回测
+
+    市场宽度跌到入场阈值及以下时按收盘价买入，升到出场阈值及以上时按收盘价卖出，
+    只做多。持仓状态由每个单元格最近一次入场事件和出场事件的先后决定，整个网格
+    是一组 单元格×日期 的矩阵运算。返回按 入场阈值、出场阈值 展开的各项指标。
+    """
+    last_entry = _threshold_events(breadth, entries, below=True)
+    last_exit = _threshold_events(breadth, exits, below=False)
+    position = (last_entry[:, None, :] > last_exit[None, :, :]).reshape(len(entries) * len(exits), -1)
+
+    returns = np.zeros(len(closes))
+    returns[1:] = closes[1:] / closes[:-1] - 1
+    returns = np.nan_to_num(returns)
+
+    # 当日收盘的持仓承担下一个交易日的涨跌
+    strategy = position[:, :-1] * returns[None, 1:]
+    equity = np.cumprod(1 + strategy, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+    opened = position & ~np.concatenate([np.zeros((len(position), 1), dtype=bool), position[:, :-1]], axis=1)
+
+    metrics = {
+        'trades': opened.sum(axis=1),
+        'exposure': position.mean(axis=1),
+        'total_return': equity[:, -1] - 1 if equity.shape[1] else np.zeros(len(position)),
+        'max_drawdown': (equity / peak - 1).min(axis=1) if equity.shape[1] else np.zeros(len(position))
+    }
+
+    # 每次入场后 h 个交易日的指数收益，末尾不足 h 天的入场不计入
+    opened = opened.astype(np.float64)
+    for horizon in horizons:
+        forward = np.full(len(closes), np.nan)
+        if horizon < len(closes):
+            forward[:-horizon] = closes[horizon:] / closes[:-horizon] - 1
+        measured = ~np.isnan(forward)
+        signals = opened @ measured
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics[f'forward_return_{horizon}'] = (opened @ np.where(measured, forward, 0.0)) / signals
+            metrics[f'hit_rate_{horizon}'] = (opened @ (forward > 0)) / signals
+        metrics[f'signals_{horizon}'] = signals.astype(np.int64)
+    return metrics
+
+
+def _backtest_task(ma_period: int, breadth: np.ndarray, closes: np.ndarray, entries: np.ndarray,
+                   exits: np.ndarray, horizons: List[int]) -> pd.DataFrame:
+    metrics = backtest_block(breadth, closes, entries, exits, horizons)
+    grid = pd.DataFrame({
+        'ma_period': ma_period,
+        'entry': np.repeat(entries, len(exits)),
+        'exit': np.tile(exits, len(entries))
+    })
+    return pd.concat([grid, pd.DataFrame(metrics)], axis=1)
+
+
+class BreadthBacktest:
+    """评估市场宽度超买超卖阈值的回测引擎
+
+    输入为 均线周期×日期 的市场宽度矩阵（calculate_ma_sweep 的结果）和指数行情，
+    对 均线周期 × 入场阈值 × 出场阈值 的网格计算总收益、最大回撤、持仓比例、交易次数，
+    以及各持有期的入场后平均收益和胜率。网格按均线周期和入场阈值分块，
+    单元格足够多时分块在进程池中并行计算。
+    """
+
+    def __init__(self, workers: int = 4, min_cells: int = 2000):
+        self.workers = workers
+        self.min_cells = min_cells
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'BreadthBacktest':
+        """从 compute 配置创建：workers 为进程数（0 表示CPU核数），parallel_min_cells 为启用并行的最少单元格数"""
+        config = config or {}
+        workers = config.get('workers', 0) or os.cpu_count() or 1
+        return cls(workers=workers, min_cells=config.get('parallel_min_cells', 2000))
+
+    @staticmethod
+    def grid_from_config(config: Dict) -> Dict:
+        """从应用配置的 backtest 部分读取回测网格：均线周期、入场阈值、出场阈值和持有期"""
+        backtest_config = (config or {}).get('backtest', {})
+
+        def thresholds(settings: Dict, default: Dict) -> List[float]:
+            settings = {**default, **(settings or {})}
+            return np.arange(settings['min'], settings['max'] + settings['step'] / 2, settings['step']).tolist()
+
+        return {
+            'periods': backtest_config.get('ma_periods') or (config or {}).get('moving_averages', [21, 63, 127]),
+            'entries': thresholds(backtest_config.get('entry_thresholds'), {'min': 5, 'max': 50, 'step': 5}),
+            'exits': thresholds(backtest_config.get('exit_thresholds'), {'min': 50, 'max': 95, 'step': 5}),
+            'horizons': backtest_config.get('horizons', [5, 20, 60])
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    @staticmethod
+    def align(breadth: pd.DataFrame, index_df: pd.DataFrame) -> tuple:
+        """把市场宽度对齐到指数的交易日，返回 (宽度矩阵, 收盘价, 日期)"""
+        closes = index_df['Close'].copy()
+        closes.index = pd.to_datetime(closes.index)
+        if closes.index.tz is not None:
+            closes.index = closes.index.tz_localize(None)
+        closes = closes.sort_index().dropna()
+
+        breadth = breadth.copy()
+        breadth.columns = pd.to_datetime(breadth.columns)
+        breadth = breadth.sort_index(axis=1)
+        dates = closes.index[(closes.index >= breadth.columns.min()) & (closes.index <= breadth.columns.max())]
+        aligned = breadth.T.reindex(dates, method='ffill').T
+        return aligned, closes.reindex(dates).to_numpy(dtype=np.float64), dates
+
+    def run(self, breadth: pd.DataFrame, index_df: pd.DataFrame, entries: List[float], exits: List[float],
+            horizons: List[int] = (5, 20, 60)) -> pd.DataFrame:
+        """回测整个参数网格，每行一个 (ma_period, entry, exit) 单元格
+
+        breadth 为 均线周期×日期 的市场宽度矩阵，index_df 为包含 Close 列的指数行情。
+        """
+        aligned, closes, dates = self.align(breadth, index_df)
+        entries = np.asarray(sorted(set(entries)), dtype=np.float64)
+        exits = np.asarray(sorted(set(exits)), dtype=np.float64)
+        horizons = sorted(set(int(h) for h in horizons))
+        if len(dates) < 2 or len(entries) == 0 or len(exits) == 0:
+            return pd.DataFrame()
+
+        # 按入场阈值分块，每块的 单元格×日期 不超过 BLOCK_SIZE
+        rows_per_block = max(1, BLOCK_SIZE // (len(exits) * len(dates)))
+        tasks = [
+            (int(ma_period), aligned.loc[ma_period].to_numpy(dtype=np.float64), closes,
+             entries[start:start + rows_per_block], exits, horizons)
+            for ma_period in aligned.index
+            for start in range(0, len(entries), rows_per_block)
+        ]
+        n_cells = len(aligned.index) * len(entries) * len(exits)
+        logging.info(f"开始回测，{len(aligned.index)} 个均线周期 × {len(entries)} 个入场阈值 × "
+                     f"{len(exits)} 个出场阈值，共 {n_cells} 个单元格，{len(dates)} 个交易日")
+
+        if self.workers > 1 and len(tasks) > 1 and n_cells >= self.min_cells:
+            executor = self._get_executor()
+            futures = [executor.submit(_backtest_task, *task) for task in tasks]
+            parts = [future.result() for future in futures]
+        else:
+            parts = [_backtest_task(*task) for task in tasks]
+        return pd.concat(parts, ignore_index=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,385 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, List
+
+
+class BreadthEngine:
+    """基于日期×股票收盘价矩阵的向量化市场宽度计算引擎"""
+
+    def __init__(self, closes: pd.DataFrame):
+        self.closes = closes.sort_index()
+        self._ma_cache = {}
+        self._extremes_cache = {}
+        self._gapped_symbols = self._find_gapped_symbols(self.closes)
+
+    @classmethod
+    def from_stock_data(cls, stocks_data: Dict[str, pd.DataFrame], field: str = 'Close') -> 'BreadthEngine':
+        """将各股票的历史数据对齐为一个日期×股票矩阵"""
+        columns = {}
+        for symbol, data in stocks_data.items():
+            if data is None or data.empty:
+                continue
+            series = data[field]
+            # 统一移除时区信息，保留交易所本地日期
+            if series.index.tz is not None:
+                series = series.tz_localize(None)
+            columns[symbol] = series[~series.index.duplicated(keep='last')]
+
+        closes = pd.DataFrame(columns, dtype=float) if columns else pd.DataFrame(dtype=float)
+        return cls(closes)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.closes.columns)
+
+    @property
+    def last_date(self) -> pd.Timestamp:
+        """矩阵中最后一根K线的日期"""
+        return self.closes.index.max() if not self.closes.empty else None
+
+    @staticmethod
+    def _find_gapped_symbols(closes: pd.DataFrame) -> List[str]:
+        """找出上市期间存在缺失K线的股票，这些股票需要按自身交易日计算均线"""
+        if closes.empty:
+            return []
+        observed = closes.notna()
+        started = observed.cummax()
+        not_ended = observed.iloc[::-1].cummax().iloc[::-1]
+        gapped = (started & not_ended & ~observed).any()
+        return list(gapped[gapped].index)
+
+    def moving_average(self, period: int) -> pd.DataFrame:
+        """一次性计算所有股票的移动平均线"""
+        if period not in self._ma_cache:
+            ma = self.closes.rolling(window=period).mean()
+            for symbol in self._gapped_symbols:
+                series = self.closes[symbol].dropna()
+                ma[symbol] = series.rolling(window=period).mean().reindex(self.closes.index)
+            self._ma_cache[period] = ma
+        return self._ma_cache[period]
+
+    def rolling_extremes(self, window: int):
+        """一次性计算所有股票的N日最高和最低收盘价（含当日）"""
+        if window not in self._extremes_cache:
+            rolling = self.closes.rolling(window=window)
+            highest, lowest = rolling.max(), rolling.min()
+            for symbol in self._gapped_symbols:
+                series_rolling = self.closes[symbol].dropna().rolling(window=window)
+                highest[symbol] = series_rolling.max().reindex(self.closes.index)
+                lowest[symbol] = series_rolling.min().reindex(self.closes.index)
+            self._extremes_cache[window] = (highest, lowest)
+        return self._extremes_cache[window]
+
+    def observation_count(self) -> pd.DataFrame:
+        """截至每个交易日各股票已有的K线数量"""
+        return self.closes.notna().cumsum()
+
+    def above_ma(self, period: int) -> pd.DataFrame:
+        """收盘价是否位于均线之上，无K线的日期为NaN"""
+        above = (self.closes > self.moving_average(period)).astype(float)
+        return above.where(self.closes.notna())
+
+    def valid_mask(self, period: int) -> pd.DataFrame:
+        """K线数量是否足以计算均线"""
+        return self.observation_count() >= period
+
+    @staticmethod
+    def align_to_dates(frame: pd.DataFrame, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """按“截至该日期的最后一根K线”把交易日矩阵对齐到目标日期"""
+        if frame.empty:
+            return pd.DataFrame(index=dates, columns=frame.columns, dtype=float)
+        return frame.ffill().reindex(dates, method='ffill')
+
+    def _aligned_above_valid(self, ma_period: int, dates: pd.DatetimeIndex):
+        """对齐到目标日期的（位于均线之上且有效，有效）布尔矩阵"""
+        above = self.align_to_dates(self.above_ma(ma_period), dates).fillna(0).astype(bool)
+        valid = self.align_to_dates(self.valid_mask(ma_period).astype(float), dates).fillna(0).astype(bool)
+        return above & valid, valid
+
+    def signal_matrices(self, ma_period: int, dates: pd.DatetimeIndex):
+        """对齐到目标日期的（位于均线之上且有效，有效）布尔矩阵，用于持久化到 SignalStore"""
+        return self._aligned_above_valid(ma_period, dates)
+
+    def breadth_counts(self, ma_period: int, dates: pd.DatetimeIndex):
+        """每个日期位于均线之上的股票数和有效股票数"""
+        above, valid = self._aligned_above_valid(ma_period, dates)
+        return above.sum(axis=1).to_numpy(), valid.sum(axis=1).to_numpy()
+
+    @classmethod
+    def _breadth_rows(cls, dates: pd.DatetimeIndex, above: pd.DataFrame, valid: pd.DataFrame) -> pd.DataFrame:
+        return cls.breadth_from_counts(dates, above.sum(axis=1).to_numpy(), valid.sum(axis=1).to_numpy())
+
+    @staticmethod
+    def breadth_from_counts(dates: pd.DatetimeIndex, stocks_above_ma: np.ndarray, valid_stocks: np.ndarray) -> pd.DataFrame:
+        """由每个日期的均线之上数量和有效数量生成市场宽度表"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            breadth = stocks_above_ma / valid_stocks * 100
+
+        result_df = pd.DataFrame({
+            'date': dates,
+            'breadth': breadth,
+            'stocks_above_ma': stocks_above_ma,
+            'valid_stocks': valid_stocks
+        })
+        return result_df[result_df['valid_stocks'] > 0].reset_index(drop=True)
+
+    def membership_mask(self, members, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """把成分股列表或 日期×股票 成分股矩阵转换为与本矩阵列一致的布尔矩阵"""
+        if isinstance(members, pd.DataFrame):
+            mask = members.reindex(index=dates, columns=self.closes.columns)
+            return mask.fillna(False).astype(bool)
+        in_universe = self.closes.columns.isin(list(members))
+        return pd.DataFrame(np.broadcast_to(in_universe, (len(dates), len(in_universe))),
+                            index=dates, columns=self.closes.columns)
+
+    def breadth(self, ma_period: int, dates: pd.DatetimeIndex, members=None) -> pd.DataFrame:
+        """计算所有日期的市场宽度，输出与缓存CSV一致的列；members 限定统计的成分股"""
+        above, valid = self._aligned_above_valid(ma_period, dates)
+        if members is not None:
+            mask = self.membership_mask(members, dates)
+            above, valid = above & mask, valid & mask
+        return self._breadth_rows(dates, above, valid)
+
+    def breadth_by_universe(self, ma_period: int, dates: pd.DatetimeIndex, universes: Dict) -> Dict[str, pd.DataFrame]:
+        """多个指数共用同一个矩阵和均线，各自按成分股掩码统计市场宽度"""
+        above, valid = self._aligned_above_valid(ma_period, dates)
+        results = {}
+        for name, members in universes.items():
+            mask = self.membership_mask(members, dates)
+            results[name] = self._breadth_rows(dates, above & mask, valid & mask)
+        return results
+
+    def new_highs_lows(self, dates: pd.DatetimeIndex, windows: List[int] = (20, 252)) -> pd.DataFrame:
+        """计算每个日期处于N日新高、新低的股票数量和比例，以及新高减新低的净值
+
+        收盘价等于N日最高（最低）收盘价即视为新高（新低），K线数量不足N根的股票不计入。
+        每个窗口输出 new_highs_N、new_lows_N、new_highs_pct_N、new_lows_pct_N、net_N、
+        net_pct_N 和 valid_stocks_N 列。
+        """
+        observed = self.closes.notna()
+        counts = self.observation_count()
+        columns = {'date': dates}
+        for window in sorted(set(windows)):
+            highest, lowest = self.rolling_extremes(window)
+            at_high = (self.closes >= highest).astype(float).where(observed)
+            at_low = (self.closes <= lowest).astype(float).where(observed)
+            valid = self.align_to_dates((counts >= window).astype(float), dates).fillna(0).astype(bool)
+            at_high = self.align_to_dates(at_high, dates).fillna(0).astype(bool) & valid
+            at_low = self.align_to_dates(at_low, dates).fillna(0).astype(bool) & valid
+
+            highs = at_high.sum(axis=1).to_numpy()
+            lows = at_low.sum(axis=1).to_numpy()
+            valid_stocks = valid.sum(axis=1).to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                columns.update({
+                    f'new_highs_{window}': highs,
+                    f'new_lows_{window}': lows,
+                    f'new_highs_pct_{window}': highs / valid_stocks * 100,
+                    f'new_lows_pct_{window}': lows / valid_stocks * 100,
+                    f'net_{window}': highs - lows,
+                    f'net_pct_{window}': (highs - lows) / valid_stocks * 100,
+                    f'valid_stocks_{window}': valid_stocks
+                })
+
+        result_df = pd.DataFrame(columns)
+        # 以最短窗口为准，至少有一只股票有效的日期才输出
+        shortest = min(windows)
+        return result_df[result_df[f'valid_stocks_{shortest}'] > 0].reset_index(drop=True)
+
+    def advance_decline_counts(self, start_date: pd.Timestamp = None, end_date: pd.Timestamp = None) -> pd.DataFrame:
+        """每个交易日的上涨、下跌、平盘股票数
+
+        每只股票与自己的上一根K线比较，当天没有K线或没有上一根K线的股票不计入；
+        只输出矩阵中实际存在的交易日，节假日不重复计数。
+        """
+        previous = self.closes.ffill().shift(1)
+        change = (self.closes - previous).to_numpy()
+        counted = ~np.isnan(change)
+        result_df = pd.DataFrame({
+            'date': self.closes.index,
+            'advances': ((change > 0) & counted).sum(axis=1),
+            'declines': ((change < 0) & counted).sum(axis=1),
+            'unchanged': ((change == 0) & counted).sum(axis=1)
+        })
+        if start_date is not None:
+            result_df = result_df[result_df['date'] >= start_date]
+        if end_date is not None:
+            result_df = result_df[result_df['date'] <= end_date]
+        counted_rows = result_df[['advances', 'declines', 'unchanged']].sum(axis=1) > 0
+        return result_df[counted_rows].reset_index(drop=True)
+
+    @staticmethod
+    def _ema(values: np.ndarray, alpha: float, initial: float = None) -> np.ndarray:
+        """指数移动平均 y_t = (1-alpha)*y_{t-1} + alpha*x_t，没有初始值时以第一个值为起点"""
+        result = np.empty(len(values))
+        previous = initial
+        for i, value in enumerate(values):
+            previous = value if previous is None else (1 - alpha) * previous + alpha * value
+            result[i] = previous
+        return result
+
+    @classmethod
+    def advance_decline_indicators(cls, counts: pd.DataFrame, previous: pd.DataFrame = None) -> pd.DataFrame:
+        """由涨跌家数计算A/D线、涨跌比、McClellan振荡器和累积指数
+
+        振荡器为净上涨家数的19日与39日指数移动平均之差（平滑系数0.1和0.05），
+        累积指数为振荡器的累加。传入 previous 时从其最后一行的状态继续递推，
+        用于在已缓存的序列后追加新交易日，结果与整段重新计算在浮点误差范围内一致。
+        """
+        result_df = counts.copy()
+        net = (result_df['advances'] - result_df['declines']).to_numpy(dtype=np.float64)
+
+        last = previous.iloc[-1] if previous is not None and not previous.empty else None
+        ad_line_base = last['ad_line'] if last is not None else 0.0
+        summation_base = last['summation_index'] if last is not None else 0.0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ad_ratio = result_df['advances'].to_numpy() / result_df['declines'].to_numpy()
+
+        ema19 = cls._ema(net, 0.1, last['ema19'] if last is not None else None)
+        ema39 = cls._ema(net, 0.05, last['ema39'] if last is not None else None)
+        oscillator = ema19 - ema39
+
+        result_df['net_advances'] = net
+        result_df['ad_line'] = ad_line_base + np.cumsum(net)
+        result_df['ad_ratio'] = ad_ratio
+        result_df['ema19'] = ema19
+        result_df['ema39'] = ema39
+        result_df['mcclellan_oscillator'] = oscillator
+        result_df['summation_index'] = summation_base + np.cumsum(oscillator)
+        return result_df
+
+    def advance_decline(self, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """计算目标日期范围内的涨跌家数、A/D线和McClellan指标"""
+        dates = pd.DatetimeIndex(dates)
+        counts = self.advance_decline_counts(dates.min(), dates.max()) if len(dates) else self.advance_decline_counts()
+        return self.advance_decline_indicators(counts)
+
+    def sector_breadth(self, ma_period: int, dates: pd.DatetimeIndex, sectors: Dict[str, str]) -> pd.DataFrame:
+        """按行业分组统计市场宽度，返回 行业×日期 的宽度矩阵
+
+        在对齐后的均线之上/有效布尔矩阵上乘以 股票×行业 的分组矩阵，一次得到所有
+        行业的计数；没有行业信息的股票不计入。
+        """
+        above, valid = self._aligned_above_valid(ma_period, dates)
+        symbol_sectors = pd.Series([sectors.get(symbol) for symbol in self.closes.columns], dtype=object)
+        codes, names = pd.factorize(symbol_sectors)
+        groups = np.zeros((len(codes), len(names)))
+        has_sector = codes >= 0
+        groups[np.flatnonzero(has_sector), codes[has_sector]] = 1
+
+        above_counts = above.to_numpy(dtype=np.float64) @ groups
+        valid_counts = valid.to_numpy(dtype=np.float64) @ groups
+        with np.errstate(divide='ignore', invalid='ignore'):
+            breadth = np.where(valid_counts > 0, above_counts / valid_counts * 100, np.nan)
+
+        result_df = pd.DataFrame(breadth.T, index=pd.Index(names, name='sector'), columns=pd.DatetimeIndex(dates))
+        return result_df.sort_index()
+
+    @staticmethod
+    def _join_members(mask: pd.DataFrame) -> np.ndarray:
+        """把每个日期为True的股票代码拼接为逗号分隔的字符串"""
+        if mask.columns.empty:
+            return np.full(len(mask), '', dtype=object)
+        return mask.dot(mask.columns + ',').str.rstrip(',').to_numpy()
+
+    def bullish_mask(self, periods: List[int]) -> pd.DataFrame:
+        """收盘价与各均线是否呈完全多头排列（价格>短期均线>...>长期均线）"""
+        periods = sorted(periods)
+        bullish = self.closes > self.moving_average(periods[0])
+        for shorter, longer in zip(periods, periods[1:]):
+            bullish &= self.moving_average(shorter) > self.moving_average(longer)
+        return bullish.astype(float).where(self.closes.notna())
+
+    def bullish_counts(self, dates: pd.DatetimeIndex, periods: List[int] = (21, 63, 127)):
+        """每个日期的多头排列数量、有效数量和多头排列成员"""
+        bullish = self.align_to_dates(self.bullish_mask(periods), dates).fillna(0).astype(bool)
+        valid = self.align_to_dates(self.valid_mask(max(periods)).astype(float), dates).fillna(0).astype(bool)
+        bullish &= valid
+        return bullish.sum(axis=1).to_numpy(), valid.sum(axis=1).to_numpy(), self._join_members(bullish)
+
+    def bullish_alignment(self, dates: pd.DatetimeIndex, periods: List[int] = (21, 63, 127)) -> pd.DataFrame:
+        """计算所有日期的完全多头排列比例、数量和成员"""
+        return self.bullish_from_counts(dates, *self.bullish_counts(dates, periods))
+
+    @staticmethod
+    def bullish_from_counts(dates: pd.DatetimeIndex, bullish_count: np.ndarray, valid_stocks: np.ndarray,
+                            bullish_stocks: np.ndarray) -> pd.DataFrame:
+        """由每个日期的多头排列数量、有效数量和成员生成多头排列表"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            breadth = bullish_count / valid_stocks * 100
+
+        result_df = pd.DataFrame({
+            'date': dates,
+            'breadth': breadth,
+            'bullish_count': bullish_count,
+            'valid_stocks': valid_stocks,
+            'bullish_stocks': bullish_stocks
+        })
+        return result_df[result_df['valid_stocks'] > 0].reset_index(drop=True)
+
+    def _last_observation_rows(self, dates: pd.DatetimeIndex) -> np.ndarray:
+        """每个目标日期、每只股票截至该日期最后一根K线所在的行号，没有K线时为-1"""
+        observed = self.closes.notna().to_numpy()
+        rows = np.arange(len(self.closes))[:, None]
+        last_rows = np.maximum.accumulate(np.where(observed, rows, -1), axis=0)
+        date_rows = np.searchsorted(self.closes.index.to_numpy(), pd.DatetimeIndex(dates).to_numpy(), side='right') - 1
+        result = np.full((len(date_rows), self.closes.shape[1]), -1, dtype=np.int64)
+        has_row = date_rows >= 0
+        result[has_row] = last_rows[date_rows[has_row]]
+        return result
+
+    def ma_sweep(self, periods: List[int], dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """用前缀和一次计算多个均线周期的市场宽度，返回 周期×日期 的宽度矩阵
+
+        每个周期的均线由前缀和相减得到，每个单元格O(1)。价格先减去各股票的首个
+        收盘价再累加，以减小前缀和的浮点误差；收盘价与均线在误差范围内相等时
+        视为不在均线之上。
+        """
+        dates = pd.DatetimeIndex(dates)
+        periods = sorted(set(int(p) for p in periods))
+        surface = np.full((len(periods), len(dates)), np.nan)
+        if self.closes.empty:
+            return pd.DataFrame(surface, index=pd.Index(periods, name='ma_period'), columns=dates)
+
+        values = self.closes.to_numpy(dtype=np.float64)
+        observed = ~np.isnan(values)
+        reference = self.closes.bfill().iloc[0].to_numpy()
+        centered = np.where(observed, values - reference, 0.0)
+        tolerance = 1e-9 * np.maximum(1.0, np.abs(reference))
+
+        n_rows, n_symbols = values.shape
+        prefix = np.vstack([np.zeros((1, n_symbols)), np.cumsum(centered, axis=0)])
+        counts = np.vstack([np.zeros((1, n_symbols), dtype=np.int64), np.cumsum(observed, axis=0)])
+
+        # 截至每个目标日期的最后一根K线
+        last_rows = self._last_observation_rows(dates)
+        has_data = last_rows >= 0
+        gather_rows = np.where(has_data, last_rows, 0)
+        gather_cols = np.broadcast_to(np.arange(n_symbols), gather_rows.shape)
+        total_counts = np.where(has_data, counts[gather_rows + 1, gather_cols], 0)
+
+        gapped = [self.closes.columns.get_loc(symbol) for symbol in self._gapped_symbols]
+
+        for i, period in enumerate(periods):
+            above = np.zeros((n_rows, n_symbols), dtype=bool)
+            if period <= n_rows:
+                window_sum = prefix[period:] - prefix[:-period]
+                window_count = counts[period:] - counts[:-period]
+                ma = window_sum / period
+                full = window_count == period
+                above[period - 1:] = full & (centered[period - 1:] > ma + tolerance)
+
+            # 上市期间有缺失K线的股票按自身交易日计算
+            for j in gapped:
+                series = self.closes.iloc[:, j]
+                ma = series.dropna().rolling(window=period).mean().reindex(self.closes.index)
+                above[:, j] = (series > ma).to_numpy()
+
+            valid = total_counts >= period
+            above_on_dates = above[gather_rows, gather_cols] & valid
+            valid_stocks = valid.sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                surface[i] = np.where(valid_stocks > 0, above_on_dates.sum(axis=1) / valid_stocks * 100, np.nan)
+
+        return pd.DataFrame(surface, index=pd.Index(periods, name='ma_period'), columns=dates)
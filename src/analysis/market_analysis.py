@@ -3,6 +3,15 @@ import numpy as np
 from typing import Dict, List
 
 class MarketAnalysis:
+    # 历史时间线各列的类别，与 analyze_market_condition 中的中文描述一致
+    STATUS_LABELS = ['极度超卖', '超卖', '中性', '偏强', '超买']
+    TREND_DIRECTION_LABELS = ['下降', '上升']
+    TREND_STRENGTH_LABELS = ['弱', '强']
+    DIVERGENCE_LABELS = ['无背离', '正背离', '负背离']
+    SIGNAL_LABELS = ['无', '买入', '卖出']
+    RISK_LABELS = ['低', '中', '高']
+    BULLISH_LABELS = ['弱势', '中性', '偏强', '强势']
+    
     def __init__(self):
         self.analysis_rules = {
             'breadth_levels': {
@@ -36,6 +45,80 @@ class MarketAnalysis:
         
         return analysis
     
+    def analyze_history(self, breadth_df: pd.DataFrame, index_df: pd.DataFrame, window: int = 20,
+                        bullish_df: pd.DataFrame = None) -> pd.DataFrame:
+        """一次计算每个日期的市场状态时间线
+        
+        每一行与在该日期调用 analyze_market_condition 的结论相同（截至该日期最近 window 个交易日），
+        用滚动窗口一次完成。状态、趋势、背离、信号和风险为 pd.Categorical 列，类别见类属性 *_LABELS；
+        传入历史多头排列数据时增加 bullish_alignment 列。
+        """
+        levels = self.analysis_rules['breadth_levels']
+        dates = pd.to_datetime(breadth_df['date'])
+        breadth = breadth_df['breadth'].astype(float).reset_index(drop=True)
+        
+        # 窗口内 window 行对应 window-1 个差分和涨跌幅
+        trend = breadth.diff().rolling(window - 1, min_periods=1).mean()
+        breadth_change = self._rolling_sum(breadth.pct_change(), window - 1)
+        volatility = breadth.rolling(window, min_periods=1).std()
+        
+        # 指数按自己的交易日计算，再取每个日期之前最近的值；没有指数数据时按涨跌幅为0处理
+        index_change = np.zeros(len(breadth))
+        if index_df is not None and not index_df.empty:
+            index_close = index_df['Close'].copy()
+            index_close.index = pd.to_datetime(index_close.index)
+            if index_close.index.tz is not None:
+                index_close.index = index_close.index.tz_localize(None)
+            index_change = self._rolling_sum(index_close.sort_index().pct_change(), window - 1)
+            index_change = index_change.reindex(dates, method='ffill').fillna(0).to_numpy()
+        
+        status = np.select(
+            [breadth <= levels['extreme_oversold'], breadth <= levels['oversold'],
+             breadth >= levels['overbought'], breadth >= levels['neutral']],
+            [0, 1, 4, 3], default=2
+        )
+        gap = breadth_change.to_numpy() - index_change
+        divergence = np.select(
+            [np.abs(gap) > self.analysis_rules['divergence_threshold']],
+            [np.where(breadth_change > index_change, 1, 2)], default=0
+        )
+        signal = np.select(
+            [breadth <= levels['extreme_oversold'], breadth >= levels['overbought']], [1, 2], default=0
+        )
+        
+        def categorical(codes, labels):
+            return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int8), categories=labels)
+        
+        timeline = pd.DataFrame({
+            'date': dates.to_numpy(),
+            'breadth': breadth,
+            'status': categorical(status, self.STATUS_LABELS),
+            'trend_direction': categorical(trend > 0, self.TREND_DIRECTION_LABELS),
+            'trend_strength': categorical(np.abs(trend) > 1, self.TREND_STRENGTH_LABELS),
+            'divergence': categorical(divergence, self.DIVERGENCE_LABELS),
+            'signal': categorical(signal, self.SIGNAL_LABELS),
+            'risk': categorical(np.select([volatility > 15, volatility > 10], [2, 1], default=0), self.RISK_LABELS)
+        })
+        
+        if bullish_df is not None and not bullish_df.empty:
+            bullish = bullish_df.set_index(pd.to_datetime(bullish_df['date']))['breadth'].sort_index()
+            bullish = bullish.reindex(dates, method='ffill').to_numpy()
+            codes = np.select([bullish >= 50, bullish >= 30, bullish >= 15], [3, 2, 1], default=0)
+            timeline['bullish_alignment'] = categorical(codes, self.BULLISH_LABELS)
+        
+        return timeline
+    
+    @staticmethod
+    def _rolling_sum(values: pd.Series, window: int) -> pd.Series:
+        """与对窗口切片调用 Series.sum() 相同的滚动求和：跳过NaN，保留无穷大（前一天为0时的涨跌幅）"""
+        total = values.where(np.isfinite(values)).rolling(window, min_periods=1).sum().fillna(0)
+        positive = (values == np.inf).rolling(window, min_periods=1).sum() > 0
+        negative = (values == -np.inf).rolling(window, min_periods=1).sum() > 0
+        total[positive] = np.inf
+        total[negative] = -np.inf
+        total[positive & negative] = np.nan
+        return total
+    
     def _get_market_status(self, breadth: float) -> dict:
         """判断市场状态"""
         if breadth <= self.analysis_rules['breadth_levels']['extreme_oversold']:
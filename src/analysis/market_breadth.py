@@ -1,16 +1,22 @@
 import pandas as pd
 import logging
-from typing import Dict, List
-from concurrent.futures import ThreadPoolExecutor
-import numpy as np
+from typing import Dict, List, Optional, Tuple
 from ..data.data_fetcher import DataFetcher
-from ..data.data_storage import DataStorage
-import pytz
+from ..data.data_storage import DataStorage, DEFAULT_UNIVERSE
+from ..data.signal_store import SignalStore
+from .breadth_engine import BreadthEngine
+from .parallel_breadth import ShardedBreadth
+from .backtest import BreadthBacktest
+from ..instrumentation import span
 
 class MarketBreadth:
-    def __init__(self, data_fetcher: DataFetcher):
+    def __init__(self, data_fetcher: DataFetcher, data_storage: DataStorage = None, signal_store: SignalStore = None):
+        """data_storage 和 signal_store 默认使用 cache 目录，基准测试等场景可以传入临时目录的实例"""
         self.data_fetcher = data_fetcher
-        self.data_storage = DataStorage()
+        self.data_storage = data_storage or DataStorage()
+        self.signal_store = signal_store or SignalStore()
+        self.sharded = ShardedBreadth.from_config((data_fetcher.config or {}).get('compute', {}))
+        self.backtester = BreadthBacktest.from_config((data_fetcher.config or {}).get('compute', {}))
         logging.basicConfig(level=logging.INFO)
     
     def calculate_ma(self, df: pd.DataFrame, period: int) -> pd.Series:
@@ -56,64 +62,250 @@ class MarketBreadth:
                     declines += 1
         return advances / declines if declines > 0 else float('inf')
     
-    def calculate_new_highs_lows(self, data: Dict[str, pd.DataFrame], period: int = 20) -> Dict:
-        """计算新高新低比率"""
-        # ... implementation ...
+    def _extend_advance_decline(self, symbols: List[str], lookback_days: int,
+                                universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """在已缓存的涨跌家数序列后追加新交易日，沿用最后一行的A/D线和均线状态；无法增量更新时返回None"""
+        cached_data = self.data_storage.load_advance_decline(len(symbols), lookback_days, max_age_hours=None,
+                                                             universe=universe)
+        metadata = self.data_storage.load_advance_decline_metadata(len(symbols), lookback_days, universe)
+        if cached_data is None or cached_data.empty or metadata is None:
+            return None
+        
+        dates = self._breadth_dates(lookback_days)
+        # 从最后一个已计算的交易日开始重算，覆盖盘中写入的不完整数据
+        last_date = pd.Timestamp(metadata.get('last_trading_date', cached_data['date'].max()))
+        kept_rows = cached_data[cached_data['date'] < last_date]
+        new_dates = dates[dates >= last_date]
+        if kept_rows.empty or len(new_dates) == 0:
+            return None
+        
+        logging.info(f"增量更新涨跌家数，新增 {len(new_dates)} 个交易日")
+        
+        # 需要新日期之前的一根K线作为比较基准
+        all_stocks_data = self._load_stocks_data(symbols, len(new_dates) + 5)
+        with span('compute', kind='advance_decline', dates=len(new_dates)):
+            engine = BreadthEngine.from_stock_data(all_stocks_data)
+            counts = engine.advance_decline_counts(new_dates[0], new_dates[-1])
+            new_rows = BreadthEngine.advance_decline_indicators(counts, kept_rows)
+        
+        # 从前端裁剪保持回溯窗口，A/D线和累积指数保留原来的起点
+        result_df = pd.concat([kept_rows, new_rows], ignore_index=True)
+        result_df = result_df[result_df['date'] >= dates[0]].reset_index(drop=True)
+        
+        self.data_storage.save_advance_decline(result_df, len(symbols), lookback_days,
+                                               last_trading_date=engine.last_date or last_date, universe=universe)
+        return result_df
     
-    def calculate_historical_breadth(self, symbols: List[str], ma_period: int, lookback_days: int = 1000) -> pd.DataFrame:
-        """计算历史市场宽度数据"""
+    def calculate_advance_decline(self, symbols: List[str], lookback_days: int = 1000, incremental: bool = True,
+                                  universe: str = DEFAULT_UNIVERSE, use_cache: bool = True) -> pd.DataFrame:
+        """计算历史涨跌家数、A/D线、涨跌比、McClellan振荡器和累积指数"""
         try:
             # 尝试从缓存加载数据
-            cached_data = self.data_storage.load_data(ma_period, len(symbols), lookback_days)
+            cached_data = self.data_storage.load_advance_decline(len(symbols), lookback_days,
+                                                                 universe=universe) if use_cache else None
             if cached_data is not None:
-                logging.info("使用缓存的市场宽度数据")
+                logging.info("使用缓存的涨跌家数数据")
                 return cached_data
-                
-            logging.info(f"开始计算历史市场宽度，样本数: {len(symbols)}, MA周期: {ma_period}, 回溯天数: {lookback_days}")
             
-            # 获取所有股票的历史数据
-            all_stocks_data = {}
-            for symbol in symbols:
-                data = self.data_fetcher.get_stock_data(symbol, lookback_days + ma_period)
-                if not data.empty:
-                    # 先移除时区信息
-                    data.index = data.index.tz_localize(None)
-                    all_stocks_data[symbol] = data
+            if incremental:
+                result_df = self._extend_advance_decline(symbols, lookback_days, universe)
+                if result_df is not None:
+                    return result_df
+            
+            logging.info(f"开始计算涨跌家数，样本数: {len(symbols)}, 回溯天数: {lookback_days}")
+            
+            all_stocks_data = self._load_stocks_data(symbols, lookback_days + 5)
+            with span('compute', kind='advance_decline', dates=lookback_days):
+                engine = BreadthEngine.from_stock_data(all_stocks_data)
+                result_df = engine.advance_decline(self._breadth_dates(lookback_days))
+            
+            # 保存计算结果到缓存
+            self.data_storage.save_advance_decline(result_df, len(symbols), lookback_days,
+                                                   last_trading_date=engine.last_date, universe=universe)
             
-            logging.info(f"成功获取 {len(all_stocks_data)} 只股票的历史数据")
+            logging.info(f"涨跌家数计算完成，共 {len(result_df)} 个交易日")
+            return result_df
+            
+        except Exception as e:
+            logging.error(f"计算涨跌家数失败: {e}")
+            return pd.DataFrame()
+    
+    def get_new_highs_lows_windows(self) -> List[int]:
+        """新高新低的窗口列表（交易日）"""
+        config = self.data_fetcher.config or {}
+        return sorted(set(config.get('new_highs_lows', {}).get('windows', [20, 252])))
+    
+    def calculate_new_highs_lows(self, symbols: List[str], windows: List[int] = None, lookback_days: int = 1000,
+                                 universe: str = DEFAULT_UNIVERSE, use_cache: bool = True) -> pd.DataFrame:
+        """计算历史新高新低：每个窗口处于N日新高、新低的股票数量、比例和净值"""
+        try:
+            windows = sorted(set(windows or self.get_new_highs_lows_windows()))
+            
+            # 尝试从缓存加载数据
+            cached_data = self.data_storage.load_new_highs_lows(windows, len(symbols), lookback_days,
+                                                                universe=universe) if use_cache else None
+            if cached_data is not None:
+                logging.info("使用缓存的新高新低数据")
+                return cached_data
+            
+            logging.info(f"开始计算新高新低，窗口: {windows}, 样本数: {len(symbols)}, 回溯天数: {lookback_days}")
+            
+            all_stocks_data = self._load_stocks_data(symbols, lookback_days + max(windows))
+            with span('compute', kind='new_highs_lows', windows=len(windows)):
+                engine = BreadthEngine.from_stock_data(all_stocks_data)
+                result_df = engine.new_highs_lows(self._breadth_dates(lookback_days), windows)
+            
+            # 保存计算结果到缓存
+            self.data_storage.save_new_highs_lows(result_df, windows, len(symbols), lookback_days, universe)
+            
+            logging.info(f"新高新低计算完成，共 {len(result_df)} 个数据点")
+            return result_df
+            
+        except Exception as e:
+            logging.error(f"计算新高新低失败: {e}")
+            return pd.DataFrame()
+    
+    def _load_stocks_data(self, symbols: List[str], period: int) -> Dict[str, pd.DataFrame]:
+        """通过批量下载接口获取所有股票的历史数据"""
+        with span('load_prices', symbols=len(symbols), period=period):
+            all_stocks_data = self.data_fetcher.get_stock_data_bulk(symbols, period)
+        
+        logging.info(f"成功获取 {len(all_stocks_data)} 只股票的历史数据")
+        return all_stocks_data
+    
+    def _breadth_dates(self, lookback_days: int) -> pd.DatetimeIndex:
+        """市场宽度的日期范围（截至今天的工作日，不带时区）"""
+        end_date = pd.Timestamp.now().normalize()  # 获取当前日期（不带时间）
+        return pd.date_range(end=end_date, periods=lookback_days, freq='B')
+    
+    def _point_in_time(self) -> bool:
+        """universe.point_in_time 开启时历史市场宽度按每个日期当时的成分股统计"""
+        return bool((self.data_fetcher.config or {}).get('universe', {}).get('point_in_time', False))
+    
+    def _membership(self, symbols: List[str], dates: pd.DatetimeIndex,
+                    universe: str = DEFAULT_UNIVERSE) -> Optional[pd.DataFrame]:
+        """开启 point_in_time 时返回 日期×股票 的历史成分股矩阵，否则返回None"""
+        if not self._point_in_time():
+            return None
+        return self.data_fetcher.universe.membership_matrix(universe, dates, symbols)
+    
+    def _cache_matches(self, metadata: dict) -> bool:
+        """缓存的统计口径（是否按历史成分股）与当前配置一致"""
+        return metadata is not None and bool(metadata.get('point_in_time', False)) == self._point_in_time()
+    
+    def _load_cached_breadth(self, symbols: List[str], ma_period: int, lookback_days: int,
+                             universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """读取未过期且统计口径与当前配置一致的市场宽度缓存，否则返回None"""
+        cached_data = self.data_storage.load_data(ma_period, len(symbols), lookback_days, universe=universe)
+        if cached_data is not None and not self._cache_matches(
+                self.data_storage.load_metadata(ma_period, len(symbols), lookback_days, universe)):
+            return None
+        return cached_data
+    
+    def _extend_historical_breadth(self, symbols: List[str], ma_period: int, lookback_days: int,
+                                   universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """在已缓存的市场宽度序列后追加新交易日，无法增量更新时返回None"""
+        cached_data = self.data_storage.load_data(ma_period, len(symbols), lookback_days, max_age_hours=None,
+                                                  universe=universe)
+        metadata = self.data_storage.load_metadata(ma_period, len(symbols), lookback_days, universe)
+        if cached_data is None or cached_data.empty or not self._cache_matches(metadata):
+            return None
+        
+        dates = self._breadth_dates(lookback_days)
+        # 从最后一根已计算的K线开始重算，覆盖盘中写入的不完整数据
+        last_date = pd.Timestamp(metadata.get('last_trading_date', cached_data['date'].max()))
+        new_dates = dates[dates >= last_date]
+        if len(new_dates) == 0 or new_dates[0] <= dates[0]:
+            return None
+        
+        logging.info(f"增量更新市场宽度，新增 {len(new_dates)} 个交易日，MA周期: {ma_period}")
+        
+        # 只获取计算新日期所需的K线
+        all_stocks_data = self._load_stocks_data(symbols, ma_period + len(new_dates))
+        with span('compute', kind='breadth', ma_period=ma_period, dates=len(new_dates)):
+            engine = BreadthEngine.from_stock_data(all_stocks_data)
+            members = self._membership(symbols, new_dates, universe)
+            if members is None:
+                new_rows = self.sharded.breadth(engine, ma_period, new_dates)
+            else:
+                new_rows = engine.breadth(ma_period, new_dates, members=members)
+        
+        # 追加新数据并从前端裁剪，保持回溯窗口
+        kept_rows = cached_data[(cached_data['date'] >= dates[0]) & (cached_data['date'] < new_dates[0])]
+        result_df = pd.concat([kept_rows, new_rows], ignore_index=True)
+        
+        self.data_storage.save_data(result_df, ma_period, len(symbols), lookback_days,
+                                    last_trading_date=engine.last_date or last_date, universe=universe,
+                                    point_in_time=members is not None)
+        return result_df
+    
+    def _breadth_from_signals(self, symbols: List[str], ma_period: int, lookback_days: int,
+                              universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """由已保存的均线信号矩阵统计任意股票子集的市场宽度，信号矩阵无法覆盖时返回None"""
+        dates = self._breadth_dates(lookback_days)
+        counts = self.signal_store.counts(universe, ma_period, symbols, dates,
+                                          members=self._membership(symbols, dates, universe))
+        if counts is None:
+            return None
+        return BreadthEngine.breadth_from_counts(dates, *counts)
+    
+    def build_signal_matrix(self, symbols: List[str], ma_period: int, lookback_days: int = 1000,
+                            universe: str = DEFAULT_UNIVERSE, replace: bool = False) -> Tuple[pd.DataFrame, pd.Timestamp]:
+        """计算并保存股票列表的均线信号矩阵，返回这些股票的市场宽度和最后一个交易日
 
-            # 创建日期范围（不带时区）
-            end_date = pd.Timestamp.now().normalize()  # 获取当前日期（不带时间）
-            dates = pd.date_range(end=end_date, periods=lookback_days, freq='B')
-            breadth_data = []
-            
-            for date in dates:
-                stocks_above_ma = 0
-                valid_stocks = 0
-                
-                for symbol, data in all_stocks_data.items():
-                    # 获取直到当前日期的数据
-                    hist_data = data[data.index <= date]
-                    if len(hist_data) >= ma_period:
-                        valid_stocks += 1
-                        # 计算MA
-                        ma = self.calculate_ma(hist_data, ma_period)
-                        if hist_data['Close'].iloc[-1] > ma.iloc[-1]:
-                            stocks_above_ma += 1
+        replace为False时按 (股票, 日期) 合并进已保存的信号矩阵（普通计算），
+        为True时总是替换（预计算按最大样本和最长回溯期重建）。保存的信号矩阵不含成分股掩码，
+        开启 point_in_time 时只在统计市场宽度时按历史成分股过滤。
+        """
+        all_stocks_data = self._load_stocks_data(symbols, lookback_days + ma_period)
+        dates = self._breadth_dates(lookback_days)
+        with span('compute', kind='signals', ma_period=ma_period, dates=len(dates)):
+            engine = BreadthEngine.from_stock_data(all_stocks_data)
+            above, valid = self.sharded.signal_matrices(engine, ma_period, dates)
+        self.signal_store.write(universe, ma_period, above, valid, replace=replace)
+        members = self._membership(symbols, dates, universe)
+        if members is not None:
+            mask = engine.membership_mask(members, dates)
+            above, valid = above & mask, valid & mask
+        result_df = BreadthEngine.breadth_from_counts(dates, above.sum(axis=1).to_numpy(),
+                                                      valid.sum(axis=1).to_numpy())
+        return result_df, engine.last_date
+    
+    def calculate_historical_breadth(self, symbols: List[str], ma_period: int, lookback_days: int = 1000,
+                                     incremental: bool = True, universe: str = DEFAULT_UNIVERSE,
+                                     use_cache: bool = True) -> pd.DataFrame:
+        """计算历史市场宽度数据，incremental为True时只计算缓存之后的新交易日
+
+        use_cache为False时忽略未过期的缓存（预计算使用），仍可增量更新。
+        """
+        try:
+            # 尝试从缓存加载数据
+            cached_data = self._load_cached_breadth(symbols, ma_period, lookback_days,
+                                                    universe) if use_cache else None
+            if cached_data is not None:
+                logging.info("使用缓存的市场宽度数据")
+                return cached_data
+            
+            # 信号矩阵覆盖这些股票和日期时只需按位统计，不同样本数量和回溯期不必重算均线
+            result_df = self._breadth_from_signals(symbols, ma_period, lookback_days, universe) if use_cache else None
+            if result_df is not None:
+                logging.info("使用均线信号矩阵统计市场宽度")
+                return result_df
+            
+            if incremental:
+                result_df = self._extend_historical_breadth(symbols, ma_period, lookback_days, universe)
+                if result_df is not None:
+                    return result_df
                 
-                if valid_stocks > 0:
-                    breadth_percentage = (stocks_above_ma / valid_stocks) * 100
-                    breadth_data.append({
-                        'date': date,
-                        'breadth': breadth_percentage,
-                        'stocks_above_ma': stocks_above_ma,
-                        'valid_stocks': valid_stocks
-                    })
+            logging.info(f"开始计算历史市场宽度，样本数: {len(symbols)}, MA周期: {ma_period}, 回溯天数: {lookback_days}")
             
-            result_df = pd.DataFrame(breadth_data)
+            # 对齐为日期×股票矩阵，每个均线只计算一次，同时保存信号矩阵
+            result_df, last_date = self.build_signal_matrix(symbols, ma_period, lookback_days, universe)
             
             # 保存计算结果到缓存
-            self.data_storage.save_data(result_df, ma_period, len(symbols), lookback_days)
+            self.data_storage.save_data(result_df, ma_period, len(symbols), lookback_days,
+                                        last_trading_date=last_date, universe=universe,
+                                        point_in_time=self._point_in_time())
             
             logging.info(f"历史市场宽度计算完成，共 {len(result_df)} 个数据点")
             return result_df
@@ -122,10 +314,159 @@ class MarketBreadth:
             logging.error(f"计算历史市场宽度失败: {e}")
             raise e
     
-    def get_index_data(self, lookback_days: int = 1000) -> pd.DataFrame:
-        """获取标普500指数数据"""
+    def get_index_symbol(self, index_name: str = DEFAULT_UNIVERSE) -> str:
+        """配置中指数对应的行情代码"""
+        config = self.data_fetcher.config or {}
+        return config.get('indices', {}).get(index_name, {}).get('symbol', "^GSPC")
+    
+    def calculate_multi_universe_breadth(self, universes: Dict[str, List[str]], ma_period: int,
+                                         lookback_days: int = 1000, use_cache: bool = True) -> Dict[str, pd.DataFrame]:
+        """同时计算多个指数的历史市场宽度
+        
+        各指数成分股的并集只获取一次行情、只计算一次均线，每个指数再按自己的
+        成分股掩码统计（开启 point_in_time 时为各自的历史成分股矩阵），结果分别按指数写入缓存。
+        """
+        results = {}
+        pending = {}
+        for name, symbols in universes.items():
+            cached_data = self._load_cached_breadth(symbols, ma_period, lookback_days,
+                                                    name) if use_cache else None
+            if cached_data is not None:
+                results[name] = cached_data
+            else:
+                pending[name] = symbols
+        
+        if pending:
+            union = list(dict.fromkeys(symbol for symbols in pending.values() for symbol in symbols))
+            logging.info(f"开始计算 {len(pending)} 个指数的市场宽度，"
+                         f"成分股合计 {sum(len(s) for s in pending.values())} 只，去重后 {len(union)} 只，MA周期: {ma_period}")
+            
+            all_stocks_data = self._load_stocks_data(union, lookback_days + ma_period)
+            dates = self._breadth_dates(lookback_days)
+            members = {name: self._membership(symbols, dates, name) for name, symbols in pending.items()}
+            members = {name: symbols if members[name] is None else members[name]
+                       for name, symbols in pending.items()}
+            with span('compute', kind='multi_universe_breadth', ma_period=ma_period, universes=len(pending)):
+                engine = BreadthEngine.from_stock_data(all_stocks_data)
+                computed = self.sharded.breadth_by_universe(engine, ma_period, dates, members)
+            
+            for name, result_df in computed.items():
+                self.data_storage.save_data(result_df, ma_period, len(pending[name]), lookback_days,
+                                            last_trading_date=engine.last_date, universe=name,
+                                            point_in_time=self._point_in_time())
+                results[name] = result_df
+        
+        return {name: results[name] for name in universes}
+    
+    def calculate_sector_breadth(self, symbols: List[str], ma_period: int, lookback_days: int = 1000,
+                                 universe: str = DEFAULT_UNIVERSE, use_cache: bool = True) -> pd.DataFrame:
+        """计算各行业的历史市场宽度，返回 行业×日期 的宽度矩阵"""
         try:
-            index_symbol = "^GSPC"
+            # 尝试从缓存加载数据
+            cached_data = self.data_storage.load_sector_breadth(ma_period, len(symbols), lookback_days,
+                                                                universe=universe) if use_cache else None
+            if cached_data is not None:
+                logging.info("使用缓存的行业市场宽度数据")
+                return cached_data
+            
+            sectors = self.data_fetcher.universe.get_sectors(universe)
+            if not sectors:
+                logging.error(f"{universe} 没有行业信息")
+                return pd.DataFrame()
+            
+            logging.info(f"开始计算行业市场宽度，样本数: {len(symbols)}, MA周期: {ma_period}, 回溯天数: {lookback_days}")
+            
+            all_stocks_data = self._load_stocks_data(symbols, lookback_days + ma_period)
+            with span('compute', kind='sector_breadth', ma_period=ma_period):
+                engine = BreadthEngine.from_stock_data(all_stocks_data)
+                result_df = engine.sector_breadth(ma_period, self._breadth_dates(lookback_days), sectors)
+            
+            # 保存计算结果到缓存
+            self.data_storage.save_sector_breadth(result_df, ma_period, len(symbols), lookback_days, universe)
+            
+            logging.info(f"行业市场宽度计算完成，{result_df.shape[0]} 个行业 × {result_df.shape[1]} 个日期")
+            return result_df
+            
+        except Exception as e:
+            logging.error(f"计算行业市场宽度失败: {e}")
+            return pd.DataFrame()
+    
+    def get_sweep_periods(self) -> List[int]:
+        """均线扫描的周期列表：ma_sweep 配置的区间加上 moving_averages 中的周期"""
+        config = self.data_fetcher.config or {}
+        sweep_config = config.get('ma_sweep', {})
+        periods = set(range(
+            sweep_config.get('min_period', 5),
+            sweep_config.get('max_period', 250) + 1,
+            sweep_config.get('step', 1)
+        ))
+        periods.update(config.get('moving_averages', []))
+        return sorted(periods)
+    
+    def calculate_ma_sweep(self, symbols: List[str], periods: List[int] = None, lookback_days: int = 1000,
+                           universe: str = DEFAULT_UNIVERSE, use_cache: bool = True) -> pd.DataFrame:
+        """一次计算多个均线周期的历史市场宽度，返回 周期×日期 的宽度矩阵"""
+        try:
+            periods = sorted(set(periods or self.get_sweep_periods()))
+            
+            # 尝试从缓存加载数据
+            cached_data = self.data_storage.load_sweep_data(periods, len(symbols), lookback_days,
+                                                            universe=universe) if use_cache else None
+            if cached_data is not None:
+                logging.info("使用缓存的均线扫描数据")
+                return cached_data
+            
+            logging.info(f"开始计算均线扫描，周期数: {len(periods)}, 样本数: {len(symbols)}, 回溯天数: {lookback_days}")
+            
+            all_stocks_data = self._load_stocks_data(symbols, lookback_days + max(periods))
+            with span('compute', kind='ma_sweep', periods=len(periods)):
+                engine = BreadthEngine.from_stock_data(all_stocks_data)
+                result_df = engine.ma_sweep(periods, self._breadth_dates(lookback_days))
+            
+            # 保存计算结果到缓存
+            self.data_storage.save_sweep_data(result_df, len(symbols), lookback_days, universe)
+            
+            logging.info(f"均线扫描计算完成，{len(periods)} 个周期 × {result_df.shape[1]} 个日期")
+            return result_df
+            
+        except Exception as e:
+            logging.error(f"计算均线扫描失败: {e}")
+            return pd.DataFrame()
+    
+    def get_backtest_grid(self) -> Dict:
+        """回测网格：均线周期、入场阈值、出场阈值和持有期，来自 backtest 配置"""
+        return BreadthBacktest.grid_from_config(self.data_fetcher.config or {})
+    
+    def backtest_thresholds(self, symbols: List[str], periods: List[int] = None, lookback_days: int = 1000,
+                            universe: str = DEFAULT_UNIVERSE, entries: List[float] = None,
+                            exits: List[float] = None, horizons: List[int] = None) -> pd.DataFrame:
+        """用缓存的均线扫描宽度和指数行情回测 均线周期×入场阈值×出场阈值 网格"""
+        try:
+            grid = self.get_backtest_grid()
+            breadth = self.calculate_ma_sweep(symbols, periods or grid['periods'], lookback_days, universe)
+            index_df = self.get_index_data(lookback_days, self.get_index_symbol(universe))
+            if breadth.empty or index_df.empty:
+                return pd.DataFrame()
+            
+            with span('compute', kind='backtest', periods=len(breadth)):
+                result_df = self.backtester.run(breadth, index_df, entries or grid['entries'],
+                                                exits or grid['exits'], horizons or grid['horizons'])
+            
+            logging.info(f"回测完成，共 {len(result_df)} 个参数组合")
+            return result_df
+            
+        except Exception as e:
+            logging.error(f"回测市场宽度阈值失败: {e}")
+            return pd.DataFrame()
+    
+    def get_index_data(self, lookback_days: int = 1000, index_symbol: str = "^GSPC",
+                       use_cache: bool = True) -> pd.DataFrame:
+        """获取指数数据（默认标普500）"""
+        try:
+            cached_data = self.data_storage.load_index_data(index_symbol, lookback_days) if use_cache else None
+            if cached_data is not None:
+                return cached_data
+            
             data = self.data_fetcher.get_stock_data(index_symbol, lookback_days)
             
             if not data.empty:
@@ -134,6 +475,7 @@ class MarketBreadth:
                 # 修改：使用第一个收盘价作为基准计算变化百分比
                 first_close = data['Close'].iloc[0]
                 data['change_pct'] = ((data['Close'] - first_close) / first_close) * 100
+                self.data_storage.save_index_data(data, index_symbol, lookback_days)
                 return data
             
             return pd.DataFrame()
@@ -198,78 +540,38 @@ class MarketBreadth:
                 'bullish_stocks': []
             }
     
-    def calculate_historical_bullish_alignment(self, symbols: List[str], lookback_days: int) -> pd.DataFrame:
+    def calculate_historical_bullish_alignment(self, symbols: List[str], lookback_days: int,
+                                               universe: str = DEFAULT_UNIVERSE,
+                                               use_cache: bool = True) -> pd.DataFrame:
         """计算历史多头排列比例"""
         try:
-            # 创建日期范围（使用美国东部时间）
-            end_date = pd.Timestamp.now(tz='America/New_York')
-            start_date = end_date - pd.Timedelta(days=lookback_days)
-            dates = pd.date_range(start=start_date, end=end_date, freq='B', tz='America/New_York')
+            # 尝试从缓存加载数据
+            cached_data = self.data_storage.load_bullish_data(len(symbols), lookback_days,
+                                                              universe=universe) if use_cache else None
+            if cached_data is not None:
+                logging.info("使用缓存的多头排列数据")
+                return cached_data
             
-            breadth_data = []
+            periods = [21, 63, 127]
+            logging.info(f"开始计算历史多头排列比例，样本数: {len(symbols)}, 回溯天数: {lookback_days}")
             
-            for current_date in dates:
-                bullish_count = 0
-                valid_stocks = 0
-                bullish_stocks = []
-                
-                for symbol in symbols:
-                    try:
-                        # 获取股票数据
-                        data = self.data_fetcher.get_stock_data(symbol, 127 * 2)
-                        
-                        if data is None or data.empty:
-                            continue
-                        
-                        # 确保索引有时区信息
-                        if data.index.tz is None:
-                            data.index = data.index.tz_localize('America/New_York')
-                        elif data.index.tz != pytz.timezone('America/New_York'):
-                            data.index = data.index.tz_convert('America/New_York')
-                        
-                        # 使用时区感知的时间戳进行过滤
-                        data = data[data.index <= current_date]
-                        
-                        if len(data) >= 127:
-                            valid_stocks += 1
-                            
-                            # 计算均线
-                            ma21 = data['Close'].rolling(window=21).mean()
-                            ma63 = data['Close'].rolling(window=63).mean()
-                            ma127 = data['Close'].rolling(window=127).mean()
-                            
-                            if not ma21.empty and not ma63.empty and not ma127.empty:
-                                latest_price = data['Close'].iloc[-1]
-                                latest_ma21 = ma21.iloc[-1]
-                                latest_ma63 = ma63.iloc[-1]
-                                latest_ma127 = ma127.iloc[-1]
-                                
-                                if not pd.isna([latest_price, latest_ma21, latest_ma63, latest_ma127]).any():
-                                    if (latest_price > latest_ma21 > latest_ma63 > latest_ma127):
-                                        bullish_count += 1
-                                        bullish_stocks.append(symbol)
-                
-                    except Exception as e:
-                        logging.error(f"处理股票 {symbol} 在日期 {current_date} 时出错: {e}")
-                        continue
-                
-                # 计算当天的多头排列比例
-                breadth = (bullish_count / valid_stocks * 100) if valid_stocks > 0 else 0
-                breadth_data.append({
-                    'date': current_date.tz_convert(None),  # 移除时区信息用于存储
-                    'breadth': breadth,
-                    'bullish_count': bullish_count,
-                    'valid_stocks': valid_stocks,
-                    'bullish_stocks': ','.join(bullish_stocks) if bullish_stocks else ''
-                })
-            
-            # 创建DataFrame
-            df = pd.DataFrame(breadth_data)
+            # 每只股票只获取一次数据，覆盖回溯期和最长均线周期
+            all_stocks_data = self._load_stocks_data(symbols, lookback_days + max(periods))
             
-            if not df.empty:
-                # 确保日期列格式正确
-                df['date'] = pd.to_datetime(df['date'])
+            # 创建日期范围（美国东部时间的交易日，不带时区）
+            end_date = pd.Timestamp.now(tz='America/New_York').tz_localize(None).normalize()
+            start_date = end_date - pd.Timedelta(days=lookback_days)
+            dates = pd.date_range(start=start_date, end=end_date, freq='B')
+            
+            # 三条均线在对齐后的矩阵上各计算一次
+            with span('compute', kind='bullish_alignment', dates=len(dates)):
+                engine = BreadthEngine.from_stock_data(all_stocks_data)
+                df = self.sharded.bullish_alignment(engine, dates, periods)
+            
+            # 保存计算结果到缓存
+            self.data_storage.save_bullish_data(df, len(symbols), lookback_days, universe)
             
+            logging.info(f"历史多头排列比例计算完成，共 {len(df)} 个数据点")
             return df
             
         except Exception as e:
@@ -0,0 +1,168 @@
+import pandas as pd
+import numpy as np
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+from .breadth_engine import BreadthEngine
+
+
+class SharedPanel:
+    """把收盘价矩阵放入共享内存，工作进程按列切片读取，不需要序列化整个矩阵"""
+
+    def __init__(self, closes: pd.DataFrame):
+        values = np.ascontiguousarray(closes.to_numpy(dtype=np.float64).T)
+        self.shape = values.shape
+        self.index = closes.index.to_numpy()
+        self.columns = list(closes.columns)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(self.shape, dtype=np.float64, buffer=self._shm.buf)[:] = values
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> 'SharedPanel':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach_shard(shm_name: str, shape: tuple, index: np.ndarray, columns: List[str],
+                  start: int, stop: int) -> BreadthEngine:
+    """在工作进程中从共享内存读取 [start, stop) 列并创建引擎"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # 矩阵按股票为行存储，每个分片是一段连续内存
+        values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)[start:stop].T.copy()
+    finally:
+        shm.close()
+    return BreadthEngine(pd.DataFrame(values, index=index, columns=columns))
+
+
+def _breadth_shard(shm_name: str, shape: tuple, index: np.ndarray, columns: List[str],
+                   start: int, stop: int, ma_period: int, dates: pd.DatetimeIndex):
+    engine = _attach_shard(shm_name, shape, index, columns, start, stop)
+    return engine.breadth_counts(ma_period, dates)
+
+
+def _signal_shard(shm_name: str, shape: tuple, index: np.ndarray, columns: List[str],
+                  start: int, stop: int, ma_period: int, dates: pd.DatetimeIndex):
+    engine = _attach_shard(shm_name, shape, index, columns, start, stop)
+    above, valid = engine.signal_matrices(ma_period, dates)
+    return above.to_numpy(), valid.to_numpy()
+
+
+def _bullish_shard(shm_name: str, shape: tuple, index: np.ndarray, columns: List[str],
+                   start: int, stop: int, dates: pd.DatetimeIndex, periods: List[int]):
+    engine = _attach_shard(shm_name, shape, index, columns, start, stop)
+    return engine.bullish_counts(dates, periods)
+
+
+class ShardedBreadth:
+    """按股票分片、在进程池中并行计算市场宽度
+
+    每个工作进程计算一段股票的 每日均线之上数量/有效数量（多头排列还包括成员），
+    父进程把各分片的计数相加。均线等逐股票的计算与串行路径完全相同，结果一致。
+    """
+
+    def __init__(self, workers: int = 4, min_symbols: int = 1000):
+        self.workers = workers
+        self.min_symbols = min_symbols
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'ShardedBreadth':
+        """从 compute 配置创建：workers 为进程数（0 表示CPU核数），parallel_min_symbols 为启用并行的最少股票数"""
+        config = config or {}
+        workers = config.get('workers', 0) or os.cpu_count() or 1
+        return cls(workers=workers, min_symbols=config.get('parallel_min_symbols', 1000))
+
+    def enabled_for(self, engine: BreadthEngine) -> bool:
+        """进程数大于1且股票数足够多时才值得并行"""
+        return self.workers > 1 and len(engine.symbols) >= max(self.min_symbols, self.workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _shards(self, n_symbols: int) -> List[tuple]:
+        bounds = np.linspace(0, n_symbols, min(self.workers, n_symbols) + 1).astype(int)
+        return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    def _map_shards(self, engine: BreadthEngine, fn, *args) -> List:
+        executor = self._get_executor()
+        with SharedPanel(engine.closes) as panel:
+            futures = [
+                executor.submit(fn, panel.name, panel.shape, panel.index, panel.columns[start:stop],
+                                start, stop, *args)
+                for start, stop in self._shards(len(panel.columns))
+            ]
+            # 按分片顺序收集，保证成员拼接顺序与串行一致
+            return [future.result() for future in futures]
+
+    def breadth(self, engine: BreadthEngine, ma_period: int, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """与 BreadthEngine.breadth 结果相同的并行版本"""
+        if not self.enabled_for(engine):
+            return engine.breadth(ma_period, dates)
+        logging.info(f"并行计算市场宽度，{len(engine.symbols)} 只股票，{self.workers} 个进程")
+        parts = self._map_shards(engine, _breadth_shard, ma_period, dates)
+        stocks_above_ma = np.sum([above for above, _ in parts], axis=0)
+        valid_stocks = np.sum([valid for _, valid in parts], axis=0)
+        return BreadthEngine.breadth_from_counts(dates, stocks_above_ma, valid_stocks)
+
+    def breadth_by_universe(self, engine: BreadthEngine, ma_period: int, dates: pd.DatetimeIndex,
+                            universes: Dict) -> Dict[str, pd.DataFrame]:
+        """与 BreadthEngine.breadth_by_universe 结果相同的并行版本，信号矩阵并行计算一次，各指数在父进程按掩码统计"""
+        if not self.enabled_for(engine):
+            return engine.breadth_by_universe(ma_period, dates, universes)
+        above, valid = self.signal_matrices(engine, ma_period, dates)
+        results = {}
+        for name, members in universes.items():
+            mask = engine.membership_mask(members, dates)
+            results[name] = BreadthEngine.breadth_from_counts(dates, (above & mask).sum(axis=1).to_numpy(),
+                                                              (valid & mask).sum(axis=1).to_numpy())
+        return results
+
+    def signal_matrices(self, engine: BreadthEngine, ma_period: int, dates: pd.DatetimeIndex):
+        """与 BreadthEngine.signal_matrices 结果相同的并行版本，按分片顺序拼接各段股票的列"""
+        if not self.enabled_for(engine):
+            return engine.signal_matrices(ma_period, dates)
+        logging.info(f"并行计算均线信号矩阵，{len(engine.symbols)} 只股票，{self.workers} 个进程")
+        parts = self._map_shards(engine, _signal_shard, ma_period, dates)
+        columns = engine.closes.columns
+        above = pd.DataFrame(np.hstack([above for above, _ in parts]), index=dates, columns=columns)
+        valid = pd.DataFrame(np.hstack([valid for _, valid in parts]), index=dates, columns=columns)
+        return above, valid
+
+    def bullish_alignment(self, engine: BreadthEngine, dates: pd.DatetimeIndex,
+                          periods: List[int] = (21, 63, 127)) -> pd.DataFrame:
+        """与 BreadthEngine.bullish_alignment 结果相同的并行版本"""
+        if not self.enabled_for(engine):
+            return engine.bullish_alignment(dates, periods)
+        logging.info(f"并行计算多头排列，{len(engine.symbols)} 只股票，{self.workers} 个进程")
+        parts = self._map_shards(engine, _bullish_shard, dates, list(periods))
+        bullish_count = np.sum([count for count, _, _ in parts], axis=0)
+        valid_stocks = np.sum([valid for _, valid, _ in parts], axis=0)
+        members = np.array([
+            ','.join(member for member in shard_members if member)
+            for shard_members in zip(*(members for _, _, members in parts))
+        ], dtype=object)
+        return BreadthEngine.bullish_from_counts(dates, bullish_count, valid_stocks, members)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,131 @@
+import pandas as pd
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Any
+
+from ..data.data_fetcher import DataFetcher
+from .market_breadth import MarketBreadth
+
+
+class SingleFlight:
+    """相同键的并发调用只执行一次，其余调用等待并共享同一个结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            logging.info("等待进行中的相同计算结果")
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class SharedEngine:
+    """进程内共享的市场宽度引擎
+
+    DataFetcher 和 MarketBreadth 常驻内存，跨页面刷新和会话复用行情缓存；
+    参数相同的并发请求合并为一次计算。返回的数据为副本，调用方可以自由修改。
+    """
+
+    def __init__(self, data_fetcher: DataFetcher = None):
+        self.data_fetcher = data_fetcher or DataFetcher()
+        self.market_breadth = MarketBreadth(self.data_fetcher)
+        self._flight = SingleFlight()
+
+    @classmethod
+    def _copy(cls, result):
+        if isinstance(result, dict):
+            return {key: cls._copy(value) for key, value in result.items()}
+        return result.copy() if isinstance(result, pd.DataFrame) else result
+
+    def _run(self, key: tuple, fn: Callable, *args, **kwargs):
+        return self._copy(self._flight.do(key, fn, *args, **kwargs))
+
+    def get_components(self, index_name: str = 'SP500') -> List[str]:
+        """获取指数成分股列表"""
+        return list(self._run(('components', index_name), self.data_fetcher.get_components, index_name))
+
+    def historical_breadth(self, symbols: List[str], ma_period: int, lookback_days: int,
+                           universe: str = 'SP500') -> pd.DataFrame:
+        """计算历史市场宽度"""
+        key = ('breadth', universe, tuple(symbols), ma_period, lookback_days)
+        return self._run(key, self.market_breadth.calculate_historical_breadth,
+                         symbols, ma_period, lookback_days=lookback_days, universe=universe)
+
+    def multi_universe_breadth(self, universes: Dict[str, List[str]], ma_period: int,
+                               lookback_days: int) -> Dict[str, pd.DataFrame]:
+        """计算多个指数的历史市场宽度，共同的成分股只获取和计算一次"""
+        key = ('multi_breadth', tuple((name, tuple(symbols)) for name, symbols in universes.items()),
+               ma_period, lookback_days)
+        return self._run(key, self.market_breadth.calculate_multi_universe_breadth,
+                         universes, ma_period, lookback_days=lookback_days)
+
+    def historical_bullish_alignment(self, symbols: List[str], lookback_days: int,
+                                     universe: str = 'SP500') -> pd.DataFrame:
+        """计算历史多头排列比例"""
+        key = ('bullish', universe, tuple(symbols), lookback_days)
+        return self._run(key, self.market_breadth.calculate_historical_bullish_alignment,
+                         symbols, lookback_days, universe=universe)
+
+    def ma_sweep(self, symbols: List[str], lookback_days: int, universe: str = 'SP500') -> pd.DataFrame:
+        """计算均线周期扫描"""
+        key = ('ma_sweep', universe, tuple(symbols), lookback_days)
+        return self._run(key, self.market_breadth.calculate_ma_sweep, symbols,
+                         lookback_days=lookback_days, universe=universe)
+
+    def new_highs_lows(self, symbols: List[str], lookback_days: int, universe: str = 'SP500') -> pd.DataFrame:
+        """计算历史新高新低"""
+        key = ('new_highs_lows', universe, tuple(symbols), lookback_days)
+        return self._run(key, self.market_breadth.calculate_new_highs_lows, symbols,
+                         lookback_days=lookback_days, universe=universe)
+
+    def advance_decline(self, symbols: List[str], lookback_days: int, universe: str = 'SP500') -> pd.DataFrame:
+        """计算历史涨跌家数与McClellan指标"""
+        key = ('advance_decline', universe, tuple(symbols), lookback_days)
+        return self._run(key, self.market_breadth.calculate_advance_decline, symbols,
+                         lookback_days=lookback_days, universe=universe)
+
+    def sector_breadth(self, symbols: List[str], ma_period: int, lookback_days: int,
+                       universe: str = 'SP500') -> pd.DataFrame:
+        """计算各行业的历史市场宽度"""
+        key = ('sector_breadth', universe, tuple(symbols), ma_period, lookback_days)
+        return self._run(key, self.market_breadth.calculate_sector_breadth, symbols, ma_period,
+                         lookback_days=lookback_days, universe=universe)
+
+    def index_data(self, lookback_days: int, index_name: str = 'SP500') -> pd.DataFrame:
+        """获取指数数据"""
+        index_symbol = self.market_breadth.get_index_symbol(index_name)
+        return self._run(('index', index_symbol, lookback_days), self.market_breadth.get_index_data,
+                         lookback_days, index_symbol)
+
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_shared_engine() -> SharedEngine:
+    """获取进程内唯一的共享引擎"""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = SharedEngine()
+        return _shared_engine
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from datetime import datetime
 import os
 import sys
+import logging
 
 # 添加项目根目录到 Python 路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -11,9 +14,16 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)  # 使用 insert 确保我们的路径在最前面
 
 # 使用从根目录开始的导入路径
-from src.data.data_fetcher import DataFetcher
-from src.analysis.market_breadth import MarketBreadth
 from src.analysis.market_analysis import MarketAnalysis
+from src.analysis.shared_engine import get_shared_engine, SharedEngine
+from src.precompute import load_status
+from src.instrumentation import instrumentation, span
+from src.downsample import downsample
+
+@st.cache_resource
+def get_engine() -> SharedEngine:
+    """跨页面刷新和会话共享的常驻引擎"""
+    return get_shared_engine()
 
 def create_gauge_chart(percentage: float, title: str) -> go.Figure:
     """创建仪表盘图表"""
@@ -36,14 +46,45 @@ def create_gauge_chart(percentage: float, title: str) -> go.Figure:
     ))
     return fig
 
-def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_period: int) -> go.Figure:
-    """创建市场宽度和标普500对比图表"""
+# 市场状态时间线的底色，中性不着色
+REGIME_COLORS = {
+    '极度超卖': "rgba(0, 160, 0, 0.18)",
+    '超卖': "rgba(0, 160, 0, 0.08)",
+    '偏强': "rgba(255, 165, 0, 0.08)",
+    '超买': "rgba(255, 0, 0, 0.15)"
+}
+
+def add_regime_shading(fig: go.Figure, timeline: pd.DataFrame):
+    """按市场状态时间线给图表加底色，相同状态的连续日期合并为一个区域"""
+    status = timeline['status'].cat.codes.to_numpy()
+    dates = timeline['date'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, status[1:] != status[:-1]])
+    stops = np.r_[starts[1:], len(status)]
+    labels = timeline['status'].cat.categories
+    for start, stop in zip(starts, stops):
+        color = REGIME_COLORS.get(labels[status[start]])
+        if color:
+            # 区域延伸到下一个状态开始的日期，相邻区域之间不留空隙
+            fig.add_vrect(x0=dates[start], x1=dates[min(stop, len(dates) - 1)],
+                          fillcolor=color, layer="below", line_width=0)
+
+def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_period: int,
+                         index_label: str = "标普500", max_points: int = None,
+                         downsample_method: str = 'lttb', timeline: pd.DataFrame = None) -> go.Figure:
+    """创建市场宽度和指数（默认标普500）对比图表
+    
+    max_points 不为空时使用WebGL曲线，每条曲线降采样到 max_points 个点，并且不显示
+    rangeslider 和 rangeselector（客户端缩放只会放大降采样后的曲线），由日期区间选择代替；
+    timeline 为 MarketAnalysis.analyze_history 的结果时按市场状态着色。
+    """
     fig = go.Figure()
+    scatter = go.Scattergl if max_points else go.Scatter
     
     # 添加市场宽度线
-    fig.add_trace(go.Scatter(
-        x=breadth_df['date'],
-        y=breadth_df['breadth'],
+    chart_breadth = downsample(breadth_df, 'date', 'breadth', max_points, downsample_method)
+    fig.add_trace(scatter(
+        x=chart_breadth['date'],
+        y=chart_breadth['breadth'],
         name='市场宽度',
         line=dict(color='#1f77b4', width=2),
         yaxis='y'
@@ -68,10 +109,11 @@ def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_pe
             filtered_index_df['relative_change'] = ((filtered_index_df['Close'] - start_price) / start_price) * 100
             
             # 添加标普500曲线
-            fig.add_trace(go.Scatter(
-                x=filtered_index_df.index,
-                y=filtered_index_df['relative_change'],
-                name='标普500',
+            chart_index = downsample(filtered_index_df, 'index', 'relative_change', max_points, downsample_method)
+            fig.add_trace(scatter(
+                x=chart_index.index,
+                y=chart_index['relative_change'],
+                name=index_label,
                 line=dict(color='#ff7f0e', width=2),
                 yaxis='y2'
             ))
@@ -83,6 +125,9 @@ def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_pe
             padding = (y2_max - y2_min) * 0.2
             y2_range = [y2_min - padding, y2_max + padding]
     
+    if timeline is not None and not timeline.empty:
+        add_regime_shading(fig, timeline)
+    
     # 添加超买超卖区域
     fig.add_hrect(
         y0=80, y1=100,
@@ -101,7 +146,7 @@ def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_pe
     # 更新布局
     fig.update_layout(
         title=dict(
-            text=f"市场宽度与标普500走势对比 ({ma_period}日均线)",
+            text=f"市场宽度与{index_label}走势对比 ({ma_period}日均线)",
             font=dict(size=24, color="#262730")
         ),
         plot_bgcolor='white',
@@ -110,8 +155,8 @@ def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_pe
             title="日期",
             gridcolor='#E5E5E5',
             showgrid=True,
-            rangeslider=dict(visible=True),
-            rangeselector=dict(
+            rangeslider=dict(visible=not max_points),
+            rangeselector=None if max_points else dict(
                 buttons=list([
                     dict(count=1, label="1月", step="month", stepmode="backward"),
                     dict(count=6, label="6月", step="month", stepmode="backward"),
@@ -130,7 +175,7 @@ def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_pe
             tickfont=dict(color="#1f77b4")
         ),
         yaxis2=dict(
-            title="标普500涨跌幅 (%)",
+            title=f"{index_label}涨跌幅 (%)",
             side="right",
             overlaying="y",
             showgrid=False,
@@ -150,14 +195,275 @@ def create_breadth_chart(breadth_df: pd.DataFrame, index_df: pd.DataFrame, ma_pe
         )
     )
     
-    # 添加对 rangeslider 的更新
+    # 添加对 rangeslider 的更新，降采样模式下不使用 rangeslider（会再复制一份数据），由日期区间选择代替
     fig.update_layout(
-        xaxis_rangeslider_visible=True,
+        xaxis_rangeslider_visible=not max_points,
         xaxis_rangeslider_thickness=0.05
     )
     
     return fig
 
+def create_universe_comparison_chart(breadth_by_universe: dict, index_by_universe: dict,
+                                     labels: dict, ma_period: int, max_points: int = None,
+                                     downsample_method: str = 'lttb') -> go.Figure:
+    """多个指数的市场宽度对比图，虚线为各自指数的涨跌幅"""
+    fig = go.Figure()
+    scatter = go.Scattergl if max_points else go.Scatter
+    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd']
+    
+    for i, (name, breadth_df) in enumerate(breadth_by_universe.items()):
+        color = colors[i % len(colors)]
+        if breadth_df.empty:
+            continue
+        chart_breadth = downsample(breadth_df, 'date', 'breadth', max_points, downsample_method)
+        fig.add_trace(scatter(
+            x=chart_breadth['date'],
+            y=chart_breadth['breadth'],
+            name=f"{labels[name]}市场宽度",
+            line=dict(color=color, width=2),
+            yaxis='y'
+        ))
+        
+        index_df = index_by_universe.get(name)
+        if index_df is None or index_df.empty:
+            continue
+        index_df = index_df[(index_df.index >= breadth_df['date'].min()) & (index_df.index <= breadth_df['date'].max())]
+        if index_df.empty:
+            continue
+        start_price = index_df['Close'].iloc[0]
+        index_df = index_df.assign(relative_change=(index_df['Close'] - start_price) / start_price * 100)
+        index_df = downsample(index_df, 'index', 'relative_change', max_points, downsample_method)
+        fig.add_trace(scatter(
+            x=index_df.index,
+            y=index_df['relative_change'],
+            name=f"{labels[name]}涨跌幅",
+            line=dict(color=color, width=1, dash='dot'),
+            yaxis='y2'
+        ))
+    
+    fig.update_layout(
+        title=dict(
+            text=f"多指数市场宽度对比 ({ma_period}日均线)",
+            font=dict(size=24, color="#262730")
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        xaxis=dict(title="日期", gridcolor='#E5E5E5', showgrid=True),
+        yaxis=dict(title="市场宽度 (%)", range=[0, 100], side="left", gridcolor='#E5E5E5', showgrid=True),
+        yaxis2=dict(title="指数涨跌幅 (%)", side="right", overlaying="y", showgrid=False),
+        hovermode='x unified',
+        showlegend=True
+    )
+    
+    return fig
+
+def render_breadth_chart(container, chart_data: dict, max_points: int, downsample_method: str):
+    """在容器中绘制市场宽度图表，通过日期区间选择放大，放大后按区间重新降采样以显示更多细节"""
+    breadth_df = chart_data['breadth_df']
+    index_df = chart_data['index_df']
+    timeline = chart_data.get('timeline')
+    with container:
+        if len(breadth_df) > 1:
+            first_date = breadth_df['date'].min().to_pydatetime()
+            last_date = breadth_df['date'].max().to_pydatetime()
+            start_date, end_date = st.slider(
+                "显示区间",
+                min_value=first_date,
+                max_value=last_date,
+                value=(first_date, last_date),
+                format="YYYY-MM-DD",
+                key=f"chart_range_{chart_data['run_id']}"
+            )
+            breadth_df = breadth_df[(breadth_df['date'] >= start_date) & (breadth_df['date'] <= end_date)]
+            if timeline is not None:
+                timeline = timeline[(timeline['date'] >= start_date) & (timeline['date'] <= end_date)]
+        
+        with span('render', chart='breadth', points=len(breadth_df)):
+            fig = create_breadth_chart(breadth_df, index_df, chart_data['ma_period'], chart_data['index_label'],
+                                       max_points, downsample_method, timeline)
+            st.plotly_chart(fig, use_container_width=True)
+
+def render_results(container, chart_data: dict, max_points: int, downsample_method: str):
+    """绘制一次分析的全部结果：主图、多头排列说明、多指数对比、行业/新高新低/涨跌家数/扫描图表和分析报告"""
+    render_breadth_chart(container, chart_data, max_points, downsample_method)
+    breadth_df = chart_data['breadth_df']
+    
+    if chart_data['ma_period'] == "bullish" and not breadth_df.empty:
+        # 显示多头排列的详细信息
+        st.subheader("多头排列分析")
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            latest_data = breadth_df.iloc[-1]
+            st.markdown(f"""
+            - 多头排列股票数量: {int(latest_data['bullish_count'])}只
+            - 有效样本数量: {int(latest_data['valid_stocks'])}只
+            - 多头排列比例: {latest_data['breadth']:.1f}%
+            """)
+        
+        with col2:
+            st.markdown("""
+            **多头排列说明**:
+            - 完全多头排列指股价位于所有均线之上
+            - 且21日均线>63日均线>127日均线
+            - 表示个股处于强势上涨趋势中
+            """)
+    
+    if chart_data.get('universes'):
+        breadth_by_universe, index_by_universe, index_labels = chart_data['universes']
+        with span('render', chart='universes'):
+            fig = create_universe_comparison_chart(breadth_by_universe, index_by_universe, index_labels,
+                                                   chart_data['ma_period'], max_points, downsample_method)
+            st.plotly_chart(fig, use_container_width=True)
+    
+    if chart_data.get('sectors') and not chart_data['sectors'][0].empty:
+        sector_df, sector_ma = chart_data['sectors']
+        with span('render', chart='sectors'):
+            st.plotly_chart(create_breadth_heatmap(sector_df, f"行业市场宽度 ({sector_ma}日均线)",
+                                                   "行业", "行业: %{y}"),
+                            use_container_width=True)
+    
+    highs_lows_df = chart_data.get('highs_lows_df')
+    if highs_lows_df is not None and not highs_lows_df.empty:
+        with span('render', chart='new_highs_lows'):
+            st.plotly_chart(create_new_highs_lows_chart(highs_lows_df, max_points, downsample_method),
+                            use_container_width=True)
+    
+    ad_df = chart_data.get('ad_df')
+    if ad_df is not None and not ad_df.empty:
+        with span('render', chart='advance_decline'):
+            st.plotly_chart(create_advance_decline_chart(ad_df, max_points, downsample_method),
+                            use_container_width=True)
+    
+    sweep_df = chart_data.get('sweep_df')
+    if sweep_df is not None and not sweep_df.empty:
+        with span('render', chart='heatmap'):
+            st.plotly_chart(create_breadth_heatmap(sweep_df), use_container_width=True)
+    
+    if chart_data.get('analysis_results'):
+        display_market_analysis(chart_data['analysis_results'])
+
+def create_new_highs_lows_chart(highs_lows_df: pd.DataFrame, max_points: int = None,
+                                downsample_method: str = 'lttb') -> go.Figure:
+    """创建各窗口新高减新低占比的走势图"""
+    fig = go.Figure()
+    scatter = go.Scattergl if max_points else go.Scatter
+    windows = sorted(int(column.rsplit('_', 1)[1]) for column in highs_lows_df.columns
+                     if column.startswith('net_pct_'))
+    
+    for window in windows:
+        column = f'net_pct_{window}'
+        chart_df = downsample(highs_lows_df.dropna(subset=[column]), 'date', column, max_points, downsample_method)
+        fig.add_trace(scatter(
+            x=chart_df['date'],
+            y=chart_df[column],
+            name=f"{window}日",
+            customdata=chart_df[[f'new_highs_{window}', f'new_lows_{window}']],
+            hovertemplate=f"{window}日新高: %{{customdata[0]}}只，新低: %{{customdata[1]}}只，净值: %{{y:.1f}}%<extra></extra>"
+        ))
+    
+    fig.add_hline(y=0, line_color='#999999', line_width=1)
+    fig.update_layout(
+        title=dict(
+            text="新高新低净值（新高占比 - 新低占比）",
+            font=dict(size=24, color="#262730")
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        xaxis=dict(title="日期", gridcolor='#E5E5E5', showgrid=True),
+        yaxis=dict(title="净新高占比 (%)", gridcolor='#E5E5E5', showgrid=True),
+        hovermode='x unified',
+        showlegend=True
+    )
+    
+    return fig
+
+def create_advance_decline_chart(ad_df: pd.DataFrame, max_points: int = None,
+                                 downsample_method: str = 'lttb') -> go.Figure:
+    """创建A/D线、McClellan振荡器和累积指数图表"""
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.05,
+                        row_heights=[0.4, 0.3, 0.3],
+                        subplot_titles=("A/D线", "McClellan振荡器", "McClellan累积指数"))
+    scatter = go.Scattergl if max_points else go.Scatter
+    
+    ad_line = downsample(ad_df, 'date', 'ad_line', max_points, downsample_method)
+    fig.add_trace(scatter(x=ad_line['date'], y=ad_line['ad_line'], name='A/D线',
+                          line=dict(color='#1f77b4', width=2)), row=1, col=1)
+    
+    oscillator = downsample(ad_df, 'date', 'mcclellan_oscillator', max_points, 'minmax')
+    fig.add_trace(go.Bar(
+        x=oscillator['date'],
+        y=oscillator['mcclellan_oscillator'],
+        name='McClellan振荡器',
+        marker_color=['#2ca02c' if value >= 0 else '#d62728' for value in oscillator['mcclellan_oscillator']]
+    ), row=2, col=1)
+    
+    summation = downsample(ad_df, 'date', 'summation_index', max_points, downsample_method)
+    fig.add_trace(scatter(x=summation['date'], y=summation['summation_index'], name='累积指数',
+                          line=dict(color='#9467bd', width=2)), row=3, col=1)
+    
+    fig.update_layout(
+        title=dict(
+            text="涨跌家数与McClellan指标",
+            font=dict(size=24, color="#262730")
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=700,
+        hovermode='x unified',
+        showlegend=False
+    )
+    
+    return fig
+
+def create_breadth_heatmap(sweep_df: pd.DataFrame, title: str = "均线周期扫描",
+                           y_title: str = "均线周期（日）", y_hover: str = "均线周期: %{y}日") -> go.Figure:
+    """创建 均线周期（或行业）×日期 的市场宽度热力图"""
+    fig = go.Figure(go.Heatmap(
+        x=sweep_df.columns,
+        y=sweep_df.index,
+        z=sweep_df.values,
+        zmin=0,
+        zmax=100,
+        colorscale='RdYlGn',
+        colorbar=dict(title="市场宽度 (%)"),
+        hovertemplate=f"日期: %{{x|%Y-%m-%d}}<br>{y_hover}<br>市场宽度: %{{z:.1f}}%<extra></extra>"
+    ))
+    
+    fig.update_layout(
+        title=dict(
+            text=title,
+            font=dict(size=24, color="#262730")
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        xaxis=dict(title="日期"),
+        yaxis=dict(title=y_title)
+    )
+    
+    return fig
+
+def display_performance_panel(run):
+    """在侧边栏展示最近一次分析各阶段的耗时和计数"""
+    st.sidebar.subheader("性能")
+    if run is None:
+        st.sidebar.caption("尚未运行分析")
+        return
+    
+    st.sidebar.caption(f"最近一次分析耗时 {run.seconds:.2f} 秒")
+    stages = pd.DataFrame(run.breakdown(), columns=['name', 'count', 'seconds', 'max_seconds'])
+    if not stages.empty:
+        st.sidebar.dataframe(
+            stages.rename(columns={'name': '阶段', 'count': '次数', 'seconds': '总耗时(秒)', 'max_seconds': '最长(秒)'}),
+            hide_index=True
+        )
+    counters = run.to_dict()['counters']
+    if counters:
+        st.sidebar.dataframe(
+            pd.DataFrame(sorted(counters.items()), columns=['计数', '值']),
+            hide_index=True
+        )
+
 def display_market_analysis(analysis_results: dict):
     """展示市场分析结果"""
     st.subheader("市场分析报告")
@@ -212,6 +518,18 @@ def main():
     with col1:
         st.sidebar.header("参数设置")
         
+        # 指数选择，选择多个指数时共同的成分股只计算一次
+        index_config = get_engine().data_fetcher.config.get('indices', {})
+        index_labels = {name: config.get('name', name) for name, config in index_config.items()}
+        selected_indices = st.sidebar.multiselect(
+            "指数",
+            list(index_labels) or ['SP500'],
+            default=['SP500'],
+            format_func=lambda name: index_labels.get(name, name)
+        ) or ['SP500']
+        primary_index = selected_indices[0]
+        primary_label = index_labels.get(primary_index, primary_index)
+        
         # 添加时间周期选择
         time_period = st.sidebar.selectbox(
             "分析时间周期",
@@ -245,55 +563,66 @@ def main():
             value=30,
             step=10
         )
+        
+        show_sweep = st.sidebar.checkbox("显示均线周期扫描热力图", value=False)
+        show_sectors = st.sidebar.checkbox("显示行业市场宽度热力图", value=False)
+        show_highs_lows = st.sidebar.checkbox("显示新高新低", value=False)
+        show_advance_decline = st.sidebar.checkbox("显示涨跌家数与McClellan指标", value=False)
+        show_regimes = st.sidebar.checkbox("在图表上标记历史市场状态", value=False)
+        show_performance = st.sidebar.checkbox("显示性能面板", value=False)
+        
+        # 收盘后预计算的状态，预计算过的组合直接读取缓存
+        precompute_status = load_status()
+        if precompute_status and precompute_status.get('last_run_end'):
+            st.sidebar.caption(
+                f"数据预计算于 {precompute_status['last_run_end'][:16].replace('T', ' ')}"
+                f"（{precompute_status['status']}，耗时 {precompute_status['duration_seconds']:.0f} 秒）"
+            )
     
     with col2:
         st.title("市场宽度分析器 📈")
         
+        # 长回溯期的曲线使用WebGL并降采样到 chart_max_points 个点
+        ui_config = get_engine().data_fetcher.config.get('ui', {})
+        max_points = ui_config.get('chart_max_points', 1000)
+        downsample_method = ui_config.get('downsample_method', 'lttb')
+        
         # 主要内容区域
-        if st.button("开始分析", key="analyze_button"):
+        analyze_clicked = st.button("开始分析", key="analyze_button")
+        chart_container = st.container()
+        if analyze_clicked:
+            instrumentation.start_run("analysis")
             try:
-                data_fetcher = DataFetcher()
-                market_breadth = MarketBreadth(data_fetcher)
-                symbols = data_fetcher.get_sp500_components()[:sample_size]
+                engine = get_engine()
+                universes = {name: engine.get_components(name)[:sample_size] for name in selected_indices}
+                symbols = universes[primary_index]
                 lookback_days = time_period[1]
                 
                 # 获取指数数据
-                index_df = market_breadth.get_index_data(lookback_days)
+                index_df = engine.index_data(lookback_days, primary_index)
                 
                 if ma_period == "bullish":
                     # 使用新的历史多头排列计算方法
-                    breadth_df = market_breadth.calculate_historical_bullish_alignment(
+                    breadth_df = engine.historical_bullish_alignment(
                         symbols, 
-                        lookback_days
+                        lookback_days,
+                        universe=primary_index
                     )
                     if not breadth_df.empty:
                         st.session_state.breadth_value = breadth_df['breadth'].iloc[-1]
-                        
-                        # 显示多头排列的详细信息
-                        st.subheader("多头排列分析")
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            latest_data = breadth_df.iloc[-1]
-                            st.markdown(f"""
-                            - 多头排列股票数量: {int(latest_data['bullish_count'])}只
-                            - 有效样本数量: {int(latest_data['valid_stocks'])}只
-                            - 多头排列比例: {latest_data['breadth']:.1f}%
-                            """)
-                        
-                        with col2:
-                            st.markdown("""
-                            **多头排列说明**:
-                            - 完全多头排列指股价位于所有均线之上
-                            - 且21日均线>63日均线>127日均线
-                            - 表示个股处于强势上涨趋势中
-                            """)
+                elif len(universes) > 1:
+                    # 多个指数一起计算，各自按成分股统计
+                    breadth_by_universe = engine.multi_universe_breadth(universes, ma_period, lookback_days)
+                    breadth_df = breadth_by_universe[primary_index]
+                    if not breadth_df.empty:
+                        st.session_state.breadth_value = breadth_df['breadth'].iloc[-1]
                 else:
                     # 原有的市场宽度计算逻辑
-                    breadth_df = market_breadth.calculate_historical_breadth(
+                    breadth_df = engine.historical_breadth(
                         symbols, 
                         ma_period,
-                        lookback_days=lookback_days
+                        lookback_days,
+                        universe=primary_index
                     )
                     if not breadth_df.empty:
                         st.session_state.breadth_value = breadth_df['breadth'].iloc[-1]
@@ -305,24 +634,63 @@ def main():
                     end_price = index_df['Close'].iloc[-1]
                     st.session_state.change_value = ((end_price - start_price) / start_price) * 100
                 
-                # 创建图表
-                fig = create_breadth_chart(breadth_df, index_df, ma_period)
-                st.plotly_chart(fig, use_container_width=True)
+                # 每个日期的市场状态，用于图表底色
+                timeline = None
+                if show_regimes and not breadth_df.empty:
+                    with span('compute', kind='market_timeline'):
+                        timeline = MarketAnalysis().analyze_history(breadth_df, index_df)
+                
+                # 计算结果全部保存在会话中，调整显示区间重新运行时不需要重新计算
+                chart_data = {
+                    'run_id': st.session_state.get('chart_data', {}).get('run_id', 0) + 1,
+                    'breadth_df': breadth_df,
+                    'index_df': index_df,
+                    'ma_period': ma_period,
+                    'index_label': primary_label,
+                    'timeline': timeline
+                }
+                
+                # 多指数对比，每个指数与自己的指数行情对比
+                if ma_period != "bullish" and len(universes) > 1:
+                    chart_data['universes'] = (breadth_by_universe,
+                                               {name: engine.index_data(lookback_days, name) for name in universes},
+                                               index_labels)
+                
+                # 行业市场宽度，多头排列模式下使用默认均线周期
+                if show_sectors:
+                    sector_ma = ma_period if ma_period != "bullish" else ui_config.get('default_ma', 21)
+                    chart_data['sectors'] = (engine.sector_breadth(symbols, sector_ma, lookback_days, primary_index),
+                                             sector_ma)
+                
+                # 新高新低、涨跌家数与McClellan指标、均线周期扫描热力图
+                if show_highs_lows:
+                    chart_data['highs_lows_df'] = engine.new_highs_lows(symbols, lookback_days, primary_index)
+                if show_advance_decline:
+                    chart_data['ad_df'] = engine.advance_decline(symbols, lookback_days, primary_index)
+                if show_sweep:
+                    chart_data['sweep_df'] = engine.ma_sweep(symbols, lookback_days, primary_index)
                 
                 # 添加市场分析
                 market_analyzer = MarketAnalysis()
-                analysis_results = market_analyzer.analyze_market_condition(
-                    breadth_df, 
-                    index_df,
-                    {'bullish_percentage': st.session_state.breadth_value} if ma_period == "bullish" else None
-                )
+                with span('compute', kind='market_analysis'):
+                    chart_data['analysis_results'] = market_analyzer.analyze_market_condition(
+                        breadth_df, 
+                        index_df,
+                        {'bullish_percentage': st.session_state.breadth_value} if ma_period == "bullish" else None
+                    )
                 
-                # 显示分析结果
-                display_market_analysis(analysis_results)
+                st.session_state.chart_data = chart_data
+                render_results(chart_container, chart_data, max_points, downsample_method)
                 
             except Exception as e:
                 st.error(str(e))  # 修改错误显示方式
                 logging.error(f"分析过程中出现错误: {str(e)}")  # 添加日志记录
+            finally:
+                # 每个会话保存自己最近一次运行的记录
+                st.session_state.last_run = instrumentation.end_run()
+        elif 'chart_data' in st.session_state:
+            # 调整显示区间等操作触发的重新运行，主图按新区间重绘，其余图表和分析报告使用保存的结果
+            render_results(chart_container, st.session_state.chart_data, max_points, downsample_method)
         
         # 使用网格布局显示指标
         metrics_container = st.container()
@@ -331,7 +699,7 @@ def main():
             with m1:
                 st.metric("当前市场宽度", f"{st.session_state.breadth_value:.1f}%")
             with m2:
-                st.metric("标普500点位", f"{st.session_state.sp500_value:.2f}")
+                st.metric(f"{primary_label}点位", f"{st.session_state.sp500_value:.2f}")
             with m3:
                 st.metric("涨跌幅", f"{st.session_state.change_value:.2f}%")
             with m4:
@@ -340,6 +708,9 @@ def main():
     with col3:
         st.markdown("### 市场状态")
         st.info(get_market_status(st.session_state.breadth_value))
+    
+    if show_performance:
+        display_performance_panel(st.session_state.get('last_run'))
 
 def get_market_status(breadth: float) -> str:
     """根据市场宽度返回市场状态描述"""
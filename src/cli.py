@@ -0,0 +1,198 @@
+"""命令行批量模式：计算或读取市场宽度、多头排列、市场状态时间线和阈值回测，导出为 CSV/JSON/Parquet
+
+    python -m src.cli breadth --index SP500 --ma 21 --lookback 365 -o breadth.parquet
+    python -m src.cli analysis --cache-only --format json
+    python -m src.cli backtest --lookback 1000 -o backtest.csv
+
+不导入 streamlit 和 plotly；pandas、yfinance 等依赖在解析完参数之后才导入，
+--help 不加载任何数据依赖，--cache-only 只读取 DataStorage 缓存，不加载行情获取模块。
+导出 Parquet 需要另外安装 pyarrow 或 fastparquet。
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import Dict
+
+FORMATS = ('csv', 'json', 'parquet')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", default="config/config.yaml", help="配置文件路径")
+    common.add_argument("--index", default="SP500", help="指数名称（config.yaml 中 indices 的键）")
+    common.add_argument("--sample-size", type=int, default=30, help="成分股样本数量")
+    common.add_argument("--lookback", type=int, default=365, help="回溯天数")
+    common.add_argument("--cache-only", action="store_true", help="只读取已有缓存，不获取行情也不计算")
+    common.add_argument("--max-age-hours", type=int, help="直接读取缓存时的最长有效时间，默认不检查")
+    common.add_argument("-o", "--output", default="-", help="输出路径，- 表示标准输出")
+    common.add_argument("--format", choices=FORMATS, help="输出格式，默认按输出文件扩展名，标准输出为 csv")
+
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="市场宽度命令行批量模式")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    breadth = subparsers.add_parser("breadth", parents=[common], help="历史市场宽度")
+    breadth.add_argument("--ma", type=int, default=21, help="均线周期")
+    subparsers.add_parser("bullish", parents=[common], help="历史多头排列比例")
+    analysis = subparsers.add_parser("analysis", parents=[common], help="每个交易日的市场状态时间线")
+    analysis.add_argument("--ma", type=int, default=21, help="均线周期")
+    analysis.add_argument("--with-bullish", action="store_true",
+                          help="缓存中没有多头排列数据时计算（默认只使用已缓存的数据）")
+    subparsers.add_parser("backtest", parents=[common], help="超买超卖阈值回测网格（参数来自 backtest 配置）")
+    return parser
+
+
+def load_config(config_path: str) -> Dict:
+    """读取配置文件，与 DataFetcher 相同，失败时返回空配置"""
+    import yaml
+    try:
+        with open(config_path, 'r', encoding='utf-8') as file:
+            return yaml.safe_load(file) or {}
+    except Exception as e:
+        logging.error(f"加载配置文件失败: {e}")
+        return {}
+
+
+class BatchSource:
+    """按命令行参数读取缓存或计算数据
+
+    --cache-only 时直接读取 DataStorage，缓存名称中的样本数即 --sample-size；
+    否则通过 MarketBreadth 计算（未过期的缓存仍然直接使用）。
+    """
+
+    def __init__(self, args: argparse.Namespace, config: Dict):
+        self.args = args
+        self.config = config
+        self._storage = None
+        self._market_breadth = None
+        self._symbols = None
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from .data.data_storage import DataStorage
+            self._storage = DataStorage()
+        return self._storage
+
+    @property
+    def market_breadth(self):
+        if self._market_breadth is None:
+            from .data.data_fetcher import DataFetcher
+            from .analysis.market_breadth import MarketBreadth
+            self._market_breadth = MarketBreadth(DataFetcher(self.args.config))
+        return self._market_breadth
+
+    @property
+    def symbols(self):
+        if self._symbols is None:
+            components = self.market_breadth.data_fetcher.get_components(self.args.index)
+            if not components:
+                raise ValueError(f"指数 {self.args.index} 的成分股列表为空")
+            self._symbols = components[:self.args.sample_size]
+        return self._symbols
+
+    def breadth(self, ma_period: int):
+        if self.args.cache_only:
+            return self.storage.load_data(ma_period, self.args.sample_size, self.args.lookback,
+                                          self.args.max_age_hours, universe=self.args.index)
+        return self.market_breadth.calculate_historical_breadth(self.symbols, ma_period, self.args.lookback,
+                                                                universe=self.args.index)
+
+    def bullish(self):
+        if self.args.cache_only:
+            return self.storage.load_bullish_data(self.args.sample_size, self.args.lookback,
+                                                  self.args.max_age_hours, universe=self.args.index)
+        return self.market_breadth.calculate_historical_bullish_alignment(self.symbols, self.args.lookback,
+                                                                          universe=self.args.index)
+
+    def cached_bullish(self):
+        """只读取已缓存的多头排列数据，不存在时返回None，不触发计算"""
+        return self.storage.load_bullish_data(self.args.sample_size, self.args.lookback,
+                                              self.args.max_age_hours, universe=self.args.index)
+
+    def index_data(self):
+        symbol = self.config.get('indices', {}).get(self.args.index, {}).get('symbol', "^GSPC")
+        if self.args.cache_only:
+            return self.storage.load_index_data(symbol, self.args.lookback, self.args.max_age_hours)
+        return self.market_breadth.get_index_data(self.args.lookback, symbol)
+
+    def sweep(self, periods):
+        if self.args.cache_only:
+            return self.storage.load_sweep_data(periods, self.args.sample_size, self.args.lookback,
+                                                self.args.max_age_hours, universe=self.args.index)
+        return self.market_breadth.calculate_ma_sweep(self.symbols, periods, self.args.lookback,
+                                                      universe=self.args.index)
+
+
+def run_command(args: argparse.Namespace, source: BatchSource):
+    """执行子命令，返回要导出的数据表，没有数据时返回None"""
+    if args.command == 'breadth':
+        return source.breadth(args.ma)
+
+    if args.command == 'bullish':
+        return source.bullish()
+
+    if args.command == 'analysis':
+        from .analysis.market_analysis import MarketAnalysis
+        breadth_df = source.breadth(args.ma)
+        if breadth_df is None or breadth_df.empty:
+            return None
+        # 多头排列需要逐只股票计算多条均线，默认只使用缓存，--with-bullish 时才计算
+        bullish_df = source.bullish() if args.with_bullish else source.cached_bullish()
+        return MarketAnalysis().analyze_history(breadth_df, source.index_data(), bullish_df=bullish_df)
+
+    if args.command == 'backtest':
+        from .analysis.backtest import BreadthBacktest
+        grid = BreadthBacktest.grid_from_config(source.config)
+        sweep = source.sweep(grid['periods'])
+        index_df = source.index_data()
+        if sweep is None or sweep.empty or index_df is None or index_df.empty:
+            return None
+        backtester = BreadthBacktest.from_config(source.config.get('compute', {}))
+        try:
+            return backtester.run(sweep, index_df, grid['entries'], grid['exits'], grid['horizons'])
+        finally:
+            backtester.shutdown()
+
+    raise ValueError(f"未知命令: {args.command}")
+
+
+def write_frame(df, output: str, fmt: str = None):
+    """按格式导出数据表，output 为 - 时写到标准输出"""
+    if fmt is None:
+        extension = os.path.splitext(output)[1].lstrip('.').lower()
+        fmt = extension if extension in FORMATS else 'csv'
+    if output == '-' and fmt == 'parquet':
+        raise ValueError("Parquet 格式需要指定输出文件")
+
+    target = sys.stdout if output == '-' else output
+    if output != '-' and os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    if fmt == 'parquet':
+        df.to_parquet(target, index=False)
+    elif fmt == 'json':
+        df.to_json(target, orient='records', date_format='iso', force_ascii=False)
+    else:
+        df.to_csv(target, index=False)
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    # 日志写到标准错误，标准输出只有导出的数据
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    try:
+        result = run_command(args, BatchSource(args, load_config(args.config)))
+        if result is None or result.empty:
+            logging.error("没有可导出的数据" + ("（缓存不存在或已过期）" if args.cache_only else ""))
+            return 1
+        write_frame(result, args.output, args.format)
+        if args.output != '-':
+            logging.info(f"已导出 {len(result)} 行到 {args.output}")
+        return 0
+    except Exception as e:
+        logging.error(f"批量导出失败: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
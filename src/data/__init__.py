@@ -1,3 +1,24 @@
-from .data_fetcher import DataFetcher
+import importlib
 
-__all__ = ['DataFetcher']
+# 按需导入（PEP 562），只读缓存的调用方不会加载 yfinance、requests 等行情依赖
+_EXPORTS = {
+    'DataFetcher': '.data_fetcher',
+    'DataStorage': '.data_storage',
+    'PriceStore': '.price_store',
+    'SignalStore': '.signal_store',
+    'UniverseManager': '.universe'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,105 @@
+import pandas as pd
+import time
+import random
+from datetime import datetime
+from typing import List, Dict
+
+from .price_store import PriceStore
+from .fetch_scheduler import ThrottledError
+
+MARKET_TZ = 'America/New_York'
+
+
+def _to_market_tz(data: pd.DataFrame) -> pd.DataFrame:
+    """统一使用美国东部时间的时区感知索引，与 Ticker.history 保持一致"""
+    if data.empty:
+        return data
+    index = pd.DatetimeIndex(data.index)
+    if index.tz is None:
+        index = index.tz_localize(MARKET_TZ)
+    else:
+        index = index.tz_convert(MARKET_TZ)
+    data.index = index
+    return data
+
+
+class YFinanceBackend:
+    """yfinance行情后端，yfinance 在第一次请求时才导入，只读缓存时不会加载"""
+
+    def history(self, symbol: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """获取单只股票的历史数据"""
+        import yfinance as yf
+        return yf.Ticker(symbol).history(start=start, end=end)
+
+    def download(self, symbols: List[str], start: datetime, end: datetime) -> Dict[str, pd.DataFrame]:
+        """通过多股票下载接口一次请求获取多只股票的数据，并拆分为单只股票的数据"""
+        import yfinance as yf
+        data = yf.download(
+            symbols,
+            start=start,
+            end=end,
+            group_by='ticker',
+            auto_adjust=True,
+            actions=True,
+            threads=False,
+            progress=False,
+            ignore_tz=False
+        )
+        if data is None or data.empty:
+            return {}
+
+        results = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
+            frame = frame.dropna(how='all')
+            if not frame.empty:
+                results[symbol] = _to_market_tz(frame.copy())
+        return results
+
+
+class LocalBackend:
+    """本地行情后端，从PriceStore读取数据，用于测试和离线运行
+
+    latency 为每次请求的模拟延迟（秒），throttle_rate 为返回429限流错误的概率，
+    request_count 记录请求次数。
+    """
+
+    def __init__(self, price_store: PriceStore = None, latency: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = None):
+        self.price_store = price_store or PriceStore()
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.request_count = 0
+        self._random = random.Random(seed)
+
+    def _request(self):
+        self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            raise ThrottledError("429 Too Many Requests")
+
+    def _read(self, symbol: str, start: datetime, end: datetime) -> pd.DataFrame:
+        data = self.price_store.read(symbol, start, end)
+        data = data.drop(columns=['Adj Close']).dropna(how='all')
+        return _to_market_tz(data)
+
+    def history(self, symbol: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """获取单只股票的历史数据"""
+        self._request()
+        return self._read(symbol, start, end)
+
+    def download(self, symbols: List[str], start: datetime, end: datetime) -> Dict[str, pd.DataFrame]:
+        """一次请求获取多只股票的数据"""
+        self._request()
+        results = {}
+        for symbol in symbols:
+            data = self._read(symbol, start, end)
+            if not data.empty:
+                results[symbol] = data
+        return results
@@ -1,19 +1,30 @@
-import yfinance as yf
 import pandas as pd
 from typing import List, Dict
 import yaml
 import logging
-from datetime import datetime, timedelta
 import concurrent.futures
 import requests
-import time
+from .backends import YFinanceBackend, MARKET_TZ, _to_market_tz
+from .fetch_scheduler import FetchScheduler
+from .frame_cache import FrameCache
+from .price_store import PriceStore
+from .universe import UniverseManager
+from ..instrumentation import span, count, submit_in_context
 
 class DataFetcher:
-    def __init__(self, config_path: str = "config/config.yaml"):
-        """初始化数据获取器"""
+    def __init__(self, config_path: str = "config/config.yaml", backend=None, price_store: PriceStore = None):
+        """初始化数据获取器，backend 默认为yfinance，测试时可替换为 LocalBackend
+
+        获取的完整历史写入 price_store（默认 data_source.price_store_dir，配置为空时不保存），
+        进程启动后内存中没有的股票先从价格库读取，只请求之后的新K线。
+        """
         self.config = self._load_config(config_path)
-        self.cache = {}
-        self.last_update = {}
+        self.backend = backend or YFinanceBackend()
+        price_store_dir = self.config.get('data_source', {}).get('price_store_dir', "cache/prices")
+        self.price_store = price_store or (PriceStore(price_store_dir) if price_store_dir else None)
+        self.scheduler = FetchScheduler.from_config(self.config.get('data_source', {}).get('scheduler', {}))
+        self.cache = FrameCache.from_config(self.config.get('data_source', {}))
+        self.universe = UniverseManager(self.config)
         logging.basicConfig(level=logging.INFO)
         self.session = requests.Session()
         self.error_count = {}
@@ -27,96 +38,208 @@ class DataFetcher:
             logging.error(f"加载配置文件失败: {e}")
             return {}
     
+    def _get_date_range(self, period: int):
+        """获取2倍周期的数据以确保有足够数据计算均线，起始日期按自然日取整"""
+        end_date = pd.Timestamp.now(tz=MARKET_TZ)
+        start_date = (end_date - pd.Timedelta(days=period * 2)).normalize()
+        return start_date, end_date
+    
+    def _plan_history(self, symbol: str, start_date: pd.Timestamp, end_date: pd.Timestamp):
+        """对照该股票的完整历史缓存，返回缓存条目和需要补齐的日期区间 {'head'/'tail': (起始, 结束)}"""
+        entry = self.cache.peek(symbol) or self._load_stored_history(symbol)
+        if entry is None:
+            count('cache_miss')
+            return None, {'tail': (start_date, end_date)}
+        
+        gaps = {}
+        covered_from = entry.meta['covered_from']
+        # 前端缺口：请求的起始日期早于已缓存的范围
+        if start_date < covered_from:
+            gaps['head'] = (start_date, covered_from)
+        # 后端缺口：缓存过期后从最后一根K线开始刷新
+        if self.cache.expired(entry):
+            gaps['tail'] = (entry.frame.index.max().normalize(), end_date)
+        count('cache_partial' if gaps else 'cache_hit')
+        return entry, gaps
+    
+    def _load_stored_history(self, symbol: str):
+        """从价格库读取该股票的历史放入内存缓存，标记为已过期，之后只补齐最后一根K线之后的数据"""
+        if self.price_store is None or not self.price_store.has(symbol):
+            return None
+        try:
+            history = self.price_store.read(symbol).drop(columns=['Adj Close']).dropna(how='all')
+        except Exception as e:
+            logging.error(f"从价格库读取股票 {symbol} 失败: {e}")
+            return None
+        if history.empty:
+            return None
+        history = _to_market_tz(history)
+        count('price_store_hit')
+        self.cache.put(symbol, history, meta={'covered_from': history.index.min().normalize()},
+                       stored_at=float('-inf'))
+        return self.cache.peek(symbol)
+    
+    def _save_history(self, symbol: str, history: pd.DataFrame):
+        """把合并后的完整历史写入价格库，同一天以新数据为准"""
+        if self.price_store is None or history.empty:
+            return
+        try:
+            with span('price_store_save', symbol=symbol, rows=len(history)):
+                self.price_store.append(symbol, history)
+        except Exception as e:
+            logging.error(f"保存股票 {symbol} 到价格库失败: {e}")
+    
+    def _merge_history(self, symbol: str, entry, start_date: pd.Timestamp, pieces: Dict) -> pd.DataFrame:
+        """把补齐的区间合并进该股票的完整历史并写回缓存"""
+        # 重叠的日期以后面的数据为准：已缓存数据覆盖前端缺口，新刷新的数据覆盖旧数据
+        frames = [pieces.get('head'), entry.frame if entry is not None else None, pieces.get('tail')]
+        frames = [data for data in frames if data is not None and not data.empty]
+        if not frames:
+            return pd.DataFrame()
+        
+        history = pd.concat(frames)
+        history = history[~history.index.duplicated(keep='last')].sort_index()
+        
+        covered_from = start_date if entry is None else min(start_date, entry.meta['covered_from'])
+        # 只补齐前端或后端刷新失败（结果为空）时保留原来的写入时间，过期的缓存下次仍会重新刷新
+        tail = pieces.get('tail')
+        refreshed = entry is None or (tail is not None and not tail.empty)
+        self.cache.put(symbol, history, meta={'covered_from': covered_from},
+                       stored_at=None if refreshed else entry.stored_at)
+        self._save_history(symbol, history)
+        return history
+    
+    @staticmethod
+    def _slice_history(history: pd.DataFrame, start_date: pd.Timestamp) -> pd.DataFrame:
+        """从完整历史中截取请求的窗口，返回副本以免调用方修改缓存"""
+        if history.empty:
+            return history
+        return history[history.index >= start_date].copy()
+    
     def get_stock_data(self, symbol: str, period: int = 21) -> pd.DataFrame:
-        """获取单个股票的历史数据"""
+        """获取单个股票的历史数据，从该股票的完整历史缓存中切片，只请求缺失的区间"""
         try:
-            # 检查缓存
-            cache_key = f"{symbol}_{period}"
-            if cache_key in self.cache:
-                last_update = self.last_update.get(cache_key)
-                if last_update and (datetime.now() - last_update).seconds < 3600:  # 1小时缓存
-                    return self.cache[cache_key]
-            
-            # 获取新数据
-            stock = yf.Ticker(symbol)
             # 获取足够长的历史数据以计算均线
-            days_needed = period * 2  # 获取2倍周期的数据以确保有足够数据计算均线
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days_needed)
+            start_date, end_date = self._get_date_range(period)
+            entry, gaps = self._plan_history(symbol, start_date, end_date)
             
-            # 添加重试机制
-            max_retries = 3
-            retry_delay = 1
-            for attempt in range(max_retries):
+            # 由调度器负责限速和退避重试
+            pieces = {}
+            for kind, gap in gaps.items():
                 try:
-                    data = stock.history(start=start_date, end=end_date)
-                    if not data.empty:
-                        # 更新缓存
-                        self.cache[cache_key] = data
-                        self.last_update[cache_key] = datetime.now()
-                        return data
-                    break
+                    with span('fetch', symbols=1):
+                        pieces[kind] = self.scheduler.call(self.backend.history, symbol, *gap)
                 except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise e
-                    time.sleep(retry_delay)
+                    # 与批量路径一致：补齐失败时使用已缓存的历史
+                    if entry is None:
+                        raise
+                    logging.error(f"补齐股票 {symbol} 的数据失败，使用已缓存的历史: {e}")
+                    pieces[kind] = None
+            history = self._merge_history(symbol, entry, start_date, pieces) if gaps else entry.frame
+            
+            data = self._slice_history(history, start_date)
+            if not data.empty:
+                count('symbols_fetched')
+                return data
             
             logging.error(f"获取股票 {symbol} 数据失败: 数据为空")
+            count('symbols_failed')
             return pd.DataFrame()
                 
         except Exception as e:
             logging.error(f"获取股票 {symbol} 数据失败: {e}")
+            count('symbols_failed')
             return pd.DataFrame()
     
     def get_stock_data_batch(self, symbols: List[str], progress_callback=None) -> Dict[str, pd.DataFrame]:
-        """批量获取股票数据"""
-        batch_size = 20  # 每批处理的股票数量
+        """批量获取股票数据，请求持续提交给调度器，不在批次之间等待"""
         results = {}
+        for symbol, data in self.scheduler.map(self.get_stock_data, symbols, progress_callback).items():
+            if isinstance(data, Exception):
+                logging.error(f"处理 {symbol} 时出错: {data}")
+            elif not data.empty:
+                results[symbol] = data
+        return results
+    
+    def _download_chunk(self, symbols: List[str], gap) -> Dict[str, pd.DataFrame]:
+        """一次请求下载一组股票在同一区间的数据，由调度器限速和重试"""
+        with span('fetch', symbols=len(symbols)):
+            return self.scheduler.call(self.backend.download, symbols, *gap)
+    
+    def get_stock_data_bulk(self, symbols: List[str], period: int = 21, chunk_size: int = None,
+                            max_workers: int = None, progress_callback=None) -> Dict[str, pd.DataFrame]:
+        """通过多股票下载接口批量获取数据，缺失区间相同的股票合并为一个请求，每个请求包含 chunk_size 只股票"""
+        data_source = self.config.get('data_source', {})
+        chunk_size = chunk_size or data_source.get('bulk_chunk_size', 100)
+        max_workers = max_workers or data_source.get('bulk_max_workers', 4)
         
-        for i in range(0, len(symbols), batch_size):
-            batch = symbols[i:i+batch_size]
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_symbol = {executor.submit(self.get_stock_data, symbol): symbol 
-                                  for symbol in batch}
+        start_date, end_date = self._get_date_range(period)
+        plans = {symbol: self._plan_history(symbol, start_date, end_date) for symbol in dict.fromkeys(symbols)}
+        
+        # 按缺失区间分组，同一区间的股票一起下载
+        gap_symbols = {}
+        for symbol, (_, gaps) in plans.items():
+            for gap in gaps.values():
+                gap_symbols.setdefault(gap, []).append(symbol)
+        chunks = [(gap, members[i:i+chunk_size])
+                  for gap, members in gap_symbols.items()
+                  for i in range(0, len(members), chunk_size)]
+        
+        pieces = {symbol: {} for symbol in plans}
+        if chunks:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_chunk = {submit_in_context(executor, self._download_chunk, chunk, gap): (gap, chunk)
+                                   for gap, chunk in chunks}
                 
                 completed = 0
-                total = len(batch)
-                
-                for future in concurrent.futures.as_completed(future_to_symbol):
-                    symbol = future_to_symbol[future]
+                for future in concurrent.futures.as_completed(future_to_chunk):
+                    gap, chunk = future_to_chunk[future]
                     completed += 1
                     
                     try:
-                        data = future.result()
-                        if not data.empty:
-                            results[symbol] = data
+                        chunk_data = future.result()
                     except Exception as e:
-                        logging.error(f"处理 {symbol} 时出错: {e}")
+                        logging.error(f"批量下载 {len(chunk)} 只股票失败: {e}")
+                        chunk_data = {}
+                    
+                    for symbol in chunk:
+                        pieces[symbol][gap] = chunk_data.get(symbol)
                     
                     if progress_callback:
-                        progress_callback(completed / total)
-            
-            # 添加延迟以避免请求过快
-            time.sleep(1)
+                        progress_callback(completed / len(chunks))
+        
+        results = {}
+        for symbol, (entry, gaps) in plans.items():
+            symbol_pieces = {kind: pieces[symbol].get(gap) for kind, gap in gaps.items()}
+            history = self._merge_history(symbol, entry, start_date, symbol_pieces) if gaps else entry.frame
+            data = self._slice_history(history, start_date)
+            if data.empty:
+                logging.error(f"获取股票 {symbol} 数据失败: 数据为空")
+                continue
+            results[symbol] = data
         
+        count('symbols_fetched', len(results))
+        count('symbols_failed', len(plans) - len(results))
         return results
     
-    def get_sp500_components(self) -> List[str]:
-        """获取标普500成分股列表"""
+    def get_components(self, index_name: str = 'SP500') -> List[str]:
+        """获取指数成分股列表，使用本地持久化的成分股表，按计划刷新"""
         try:
-            url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-            tables = pd.read_html(url)
-            df = tables[0]
-            return df['Symbol'].tolist()
+            return self.universe.get_members(index_name)
         except Exception as e:
-            logging.error(f"获取标普500成分股失败: {e}")
+            logging.error(f"获取 {index_name} 成分股失败: {e}")
             return []
     
+    def get_sp500_components(self) -> List[str]:
+        """获取标普500成分股列表"""
+        return self.get_components('SP500')
+    
     def get_index_data(self, index_name: str) -> Dict:
         """获取指数数据"""
         try:
             index_config = self.config['indices'][index_name]
             symbol = index_config['symbol']
+            import yfinance as yf
             index = yf.Ticker(symbol)
             data = index.history(period="1d")
             return {
@@ -1,8 +1,14 @@
 import pandas as pd
 import os
+import glob
 import json
 from datetime import datetime, timedelta
 import logging
+from typing import List, Optional
+
+from ..instrumentation import span, count
+
+DEFAULT_UNIVERSE = 'SP500'
 
 class DataStorage:
     def __init__(self, cache_dir="cache"):
@@ -14,58 +20,299 @@ class DataStorage:
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
             
+    def _get_frame_path(self, name: str) -> str:
+        """获取数据表缓存文件路径"""
+        return os.path.join(self.cache_dir, f"{name}.csv")
+        
+    def _get_frame_metadata_path(self, name: str) -> str:
+        """获取数据表元数据文件路径"""
+        return os.path.join(self.cache_dir, f"{name}_metadata.json")
+    
+    @staticmethod
+    def _universe_prefix(prefix: str, universe: str) -> str:
+        """标普500沿用原来的文件名，其他指数在前缀后加上指数名称"""
+        if universe in (None, DEFAULT_UNIVERSE):
+            return prefix
+        return f"{prefix}_{universe}"
+    
+    def _get_breadth_name(self, ma_period: int, sample_size: int, lookback_days: int,
+                          universe: str = DEFAULT_UNIVERSE) -> str:
+        """市场宽度缓存名称"""
+        return f"{self._universe_prefix('market_breadth', universe)}_ma{ma_period}_n{sample_size}_d{lookback_days}"
+    
+    def _get_bullish_name(self, sample_size: int, lookback_days: int, universe: str = DEFAULT_UNIVERSE) -> str:
+        """多头排列缓存名称"""
+        return f"{self._universe_prefix('bullish_alignment', universe)}_n{sample_size}_d{lookback_days}"
+    
+    def _get_sweep_name(self, periods: List[int], sample_size: int, lookback_days: int,
+                        universe: str = DEFAULT_UNIVERSE) -> str:
+        """均线周期扫描缓存名称"""
+        prefix = self._universe_prefix('ma_sweep', universe)
+        return f"{prefix}_p{min(periods)}-{max(periods)}_n{sample_size}_d{lookback_days}"
+    
+    def _get_new_highs_lows_name(self, windows: List[int], sample_size: int, lookback_days: int,
+                                 universe: str = DEFAULT_UNIVERSE) -> str:
+        """新高新低缓存名称"""
+        prefix = self._universe_prefix('new_highs_lows', universe)
+        return f"{prefix}_w{'-'.join(str(w) for w in sorted(windows))}_n{sample_size}_d{lookback_days}"
+    
+    def _get_advance_decline_name(self, sample_size: int, lookback_days: int, universe: str = DEFAULT_UNIVERSE) -> str:
+        """涨跌家数与McClellan指标缓存名称"""
+        return f"{self._universe_prefix('advance_decline', universe)}_n{sample_size}_d{lookback_days}"
+    
+    def _get_sector_breadth_name(self, ma_period: int, sample_size: int, lookback_days: int,
+                                 universe: str = DEFAULT_UNIVERSE) -> str:
+        """行业市场宽度缓存名称"""
+        return f"{self._universe_prefix('sector_breadth', universe)}_ma{ma_period}_n{sample_size}_d{lookback_days}"
+    
+    def _get_index_name(self, symbol: str, lookback_days: int) -> str:
+        """指数行情缓存名称"""
+        return f"index_{symbol.lstrip('^')}_d{lookback_days}"
+            
     def _get_cache_path(self, ma_period: int, sample_size: int, lookback_days: int) -> str:
         """获取缓存文件路径"""
-        return os.path.join(
-            self.cache_dir, 
-            f"market_breadth_ma{ma_period}_n{sample_size}_d{lookback_days}.csv"
-        )
+        return self._get_frame_path(self._get_breadth_name(ma_period, sample_size, lookback_days))
         
     def _get_metadata_path(self, ma_period: int, sample_size: int, lookback_days: int) -> str:
         """获取元数据文件路径"""
-        return os.path.join(
-            self.cache_dir, 
-            f"market_breadth_ma{ma_period}_n{sample_size}_d{lookback_days}_metadata.json"
-        )
-    
-    def save_data(self, df: pd.DataFrame, ma_period: int, sample_size: int, lookback_days: int):
-        """保存市场宽度数据和元数据"""
-        # 保存数据
-        cache_path = self._get_cache_path(ma_period, sample_size, lookback_days)
-        df.to_csv(cache_path, index=True)
-        
-        # 保存元数据
-        metadata = {
-            "last_update": datetime.now().isoformat(),
-            "ma_period": ma_period,
-            "sample_size": sample_size,
-            "lookback_days": lookback_days
-        }
-        
-        with open(self._get_metadata_path(ma_period, sample_size, lookback_days), 'w') as f:
-            json.dump(metadata, f)
+        return self._get_frame_metadata_path(self._get_breadth_name(ma_period, sample_size, lookback_days))
+    
+    def save_frame(self, df: pd.DataFrame, name: str, metadata: dict = None):
+        """保存任意数据表和元数据，先写临时文件再替换，避免读取到写了一半的文件"""
+        cache_path = self._get_frame_path(name)
+        with span('storage_save', frame=name, rows=len(df)):
+            df.to_csv(f"{cache_path}.tmp", index=True)
+            os.replace(f"{cache_path}.tmp", cache_path)
             
-    def load_data(self, ma_period: int, sample_size: int, lookback_days: int, max_age_hours: int = 24) -> pd.DataFrame:
-        """加载市场宽度数据，如果数据过期则返回None"""
-        cache_path = self._get_cache_path(ma_period, sample_size, lookback_days)
-        metadata_path = self._get_metadata_path(ma_period, sample_size, lookback_days)
+            metadata = dict(metadata or {})
+            metadata["last_update"] = datetime.now().isoformat()
+            
+            metadata_path = self._get_frame_metadata_path(name)
+            with open(f"{metadata_path}.tmp", 'w') as f:
+                json.dump(metadata, f)
+            os.replace(f"{metadata_path}.tmp", metadata_path)
+            
+    def load_frame_metadata(self, name: str) -> dict:
+        """读取数据表的元数据，不存在时返回None"""
+        metadata_path = self._get_frame_metadata_path(name)
+        if not os.path.exists(metadata_path):
+            return None
+        with open(metadata_path, 'r') as f:
+            return json.load(f)
+            
+    def frame_version(self, name: str) -> Optional[tuple]:
+        """数据表文件的版本（修改时间和大小），不存在时返回None，用于判断内存中的副本是否需要重新读取"""
+        try:
+            stat = os.stat(self._get_frame_path(name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load_frame(self, name: str, max_age_hours: Optional[int] = 24) -> pd.DataFrame:
+        """加载数据表，如果数据过期则返回None；max_age_hours为None时不检查是否过期"""
+        cache_path = self._get_frame_path(name)
         
-        if not (os.path.exists(cache_path) and os.path.exists(metadata_path)):
+        metadata = self.load_frame_metadata(name)
+        if metadata is None or not os.path.exists(cache_path):
+            count('storage_miss')
             return None
             
         # 检查数据是否过期
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-            
         last_update = datetime.fromisoformat(metadata['last_update'])
-        if datetime.now() - last_update > timedelta(hours=max_age_hours):
+        if max_age_hours is not None and datetime.now() - last_update > timedelta(hours=max_age_hours):
+            count('storage_expired')
             return None
             
         # 加载数据
         try:
-            df = pd.read_csv(cache_path)
-            df['date'] = pd.to_datetime(df['date'])
+            with span('storage_load', frame=name):
+                df = pd.read_csv(cache_path, index_col=0)
+                if 'date' in df.columns:
+                    df['date'] = pd.to_datetime(df['date'])
+            count('storage_hit')
             return df
         except Exception as e:
             logging.error(f"加载缓存数据失败: {e}")
             return None
+    
+    def save_data(self, df: pd.DataFrame, ma_period: int, sample_size: int, lookback_days: int,
+                  last_trading_date: Optional[pd.Timestamp] = None, universe: str = DEFAULT_UNIVERSE,
+                  point_in_time: bool = False):
+        """保存市场宽度数据和元数据，point_in_time 记录是否按历史成分股统计"""
+        metadata = {
+            "ma_period": ma_period,
+            "sample_size": sample_size,
+            "lookback_days": lookback_days,
+            "universe": universe,
+            "point_in_time": point_in_time
+        }
+        if last_trading_date is not None:
+            metadata["last_trading_date"] = pd.Timestamp(last_trading_date).strftime('%Y-%m-%d')
+        self.save_frame(df, self._get_breadth_name(ma_period, sample_size, lookback_days, universe), metadata)
+            
+    def load_data(self, ma_period: int, sample_size: int, lookback_days: int, max_age_hours: Optional[int] = 24,
+                  universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """加载市场宽度数据，如果数据过期则返回None"""
+        return self.load_frame(self._get_breadth_name(ma_period, sample_size, lookback_days, universe), max_age_hours)
+    
+    def load_metadata(self, ma_period: int, sample_size: int, lookback_days: int,
+                      universe: str = DEFAULT_UNIVERSE) -> dict:
+        """读取市场宽度数据的元数据"""
+        return self.load_frame_metadata(self._get_breadth_name(ma_period, sample_size, lookback_days, universe))
+    
+    def data_version(self, ma_period: int, sample_size: int, lookback_days: int,
+                     universe: str = DEFAULT_UNIVERSE) -> Optional[tuple]:
+        """市场宽度缓存文件的版本"""
+        return self.frame_version(self._get_breadth_name(ma_period, sample_size, lookback_days, universe))
+    
+    def save_bullish_data(self, df: pd.DataFrame, sample_size: int, lookback_days: int,
+                          universe: str = DEFAULT_UNIVERSE):
+        """保存多头排列数据和元数据"""
+        self.save_frame(df, self._get_bullish_name(sample_size, lookback_days, universe), {
+            "sample_size": sample_size,
+            "lookback_days": lookback_days,
+            "universe": universe
+        })
+    
+    def load_bullish_data(self, sample_size: int, lookback_days: int, max_age_hours: int = 24,
+                          universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """加载多头排列数据，如果数据过期则返回None"""
+        df = self.load_frame(self._get_bullish_name(sample_size, lookback_days, universe), max_age_hours)
+        if df is not None and 'bullish_stocks' in df.columns:
+            df['bullish_stocks'] = df['bullish_stocks'].fillna('')
+        return df
+    
+    def bullish_data_version(self, sample_size: int, lookback_days: int,
+                             universe: str = DEFAULT_UNIVERSE) -> Optional[tuple]:
+        """多头排列缓存文件的版本"""
+        return self.frame_version(self._get_bullish_name(sample_size, lookback_days, universe))
+    
+    def save_sweep_data(self, df: pd.DataFrame, sample_size: int, lookback_days: int,
+                        universe: str = DEFAULT_UNIVERSE):
+        """保存均线周期×日期的宽度矩阵"""
+        periods = [int(p) for p in df.index]
+        wide = df.copy()
+        wide.columns = pd.DatetimeIndex(wide.columns).strftime('%Y-%m-%d')
+        self.save_frame(wide, self._get_sweep_name(periods, sample_size, lookback_days, universe), {
+            "periods": periods,
+            "sample_size": sample_size,
+            "lookback_days": lookback_days,
+            "universe": universe
+        })
+    
+    def _find_sweep_name(self, periods: List[int], sample_size: int, lookback_days: int,
+                         universe: str = DEFAULT_UNIVERSE) -> Optional[str]:
+        """查找包含全部所需周期的扫描缓存：优先周期完全一致的，其次周期最少的更宽扫描"""
+        name = self._get_sweep_name(periods, sample_size, lookback_days, universe)
+        metadata = self.load_frame_metadata(name)
+        if metadata is not None and set(periods) <= set(metadata.get('periods', [])):
+            return name
+
+        pattern = self._get_frame_metadata_path(
+            f"{glob.escape(self._universe_prefix('ma_sweep', universe))}_p*_n{sample_size}_d{lookback_days}")
+        candidates = []
+        for metadata_path in glob.glob(pattern):
+            candidate = os.path.basename(metadata_path)[:-len("_metadata.json")]
+            metadata = self.load_frame_metadata(candidate)
+            if metadata is not None and set(periods) <= set(metadata.get('periods', [])):
+                candidates.append((len(metadata['periods']), candidate))
+        return min(candidates)[1] if candidates else None
+    
+    def load_sweep_data(self, periods: List[int], sample_size: int, lookback_days: int,
+                        max_age_hours: int = 24, universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """加载均线周期×日期的宽度矩阵，没有包含全部周期的缓存或数据过期时返回None
+        
+        已缓存的扫描周期更多时（例如页面热力图的 5-250 扫描）从中取出所需的周期。
+        """
+        periods = sorted(set(int(p) for p in periods))
+        name = self._find_sweep_name(periods, sample_size, lookback_days, universe)
+        if name is None:
+            count('storage_miss')
+            return None
+        df = self.load_frame(name, max_age_hours)
+        if df is None:
+            return None
+        df.index = pd.Index([int(p) for p in df.index], name=df.index.name)
+        if not set(periods) <= set(df.index):
+            return None
+        df = df.loc[periods]
+        df.columns = pd.to_datetime(df.columns)
+        return df
+    
+    def save_new_highs_lows(self, df: pd.DataFrame, windows: List[int], sample_size: int, lookback_days: int,
+                            universe: str = DEFAULT_UNIVERSE):
+        """保存新高新低数据和元数据"""
+        self.save_frame(df, self._get_new_highs_lows_name(windows, sample_size, lookback_days, universe), {
+            "windows": sorted(windows),
+            "sample_size": sample_size,
+            "lookback_days": lookback_days,
+            "universe": universe
+        })
+    
+    def load_new_highs_lows(self, windows: List[int], sample_size: int, lookback_days: int,
+                            max_age_hours: int = 24, universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """加载新高新低数据，如果数据过期则返回None"""
+        return self.load_frame(self._get_new_highs_lows_name(windows, sample_size, lookback_days, universe),
+                               max_age_hours)
+    
+    def save_advance_decline(self, df: pd.DataFrame, sample_size: int, lookback_days: int,
+                             last_trading_date: Optional[pd.Timestamp] = None, universe: str = DEFAULT_UNIVERSE):
+        """保存涨跌家数与McClellan指标数据和元数据"""
+        metadata = {
+            "sample_size": sample_size,
+            "lookback_days": lookback_days,
+            "universe": universe
+        }
+        if last_trading_date is not None:
+            metadata["last_trading_date"] = pd.Timestamp(last_trading_date).strftime('%Y-%m-%d')
+        self.save_frame(df, self._get_advance_decline_name(sample_size, lookback_days, universe), metadata)
+    
+    def load_advance_decline(self, sample_size: int, lookback_days: int, max_age_hours: Optional[int] = 24,
+                             universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """加载涨跌家数与McClellan指标数据，如果数据过期则返回None"""
+        return self.load_frame(self._get_advance_decline_name(sample_size, lookback_days, universe), max_age_hours)
+    
+    def load_advance_decline_metadata(self, sample_size: int, lookback_days: int,
+                                      universe: str = DEFAULT_UNIVERSE) -> dict:
+        """读取涨跌家数数据的元数据"""
+        return self.load_frame_metadata(self._get_advance_decline_name(sample_size, lookback_days, universe))
+    
+    def save_sector_breadth(self, df: pd.DataFrame, ma_period: int, sample_size: int, lookback_days: int,
+                            universe: str = DEFAULT_UNIVERSE):
+        """保存行业×日期的宽度矩阵"""
+        wide = df.copy()
+        wide.columns = pd.DatetimeIndex(wide.columns).strftime('%Y-%m-%d')
+        self.save_frame(wide, self._get_sector_breadth_name(ma_period, sample_size, lookback_days, universe), {
+            "ma_period": ma_period,
+            "sectors": list(df.index),
+            "sample_size": sample_size,
+            "lookback_days": lookback_days,
+            "universe": universe
+        })
+    
+    def load_sector_breadth(self, ma_period: int, sample_size: int, lookback_days: int,
+                            max_age_hours: int = 24, universe: str = DEFAULT_UNIVERSE) -> pd.DataFrame:
+        """加载行业×日期的宽度矩阵，如果数据过期则返回None"""
+        df = self.load_frame(self._get_sector_breadth_name(ma_period, sample_size, lookback_days, universe),
+                             max_age_hours)
+        if df is not None:
+            df.columns = pd.to_datetime(df.columns)
+        return df
+    
+    def save_index_data(self, df: pd.DataFrame, symbol: str, lookback_days: int):
+        """保存指数行情（以日期为索引）"""
+        self.save_frame(df, self._get_index_name(symbol, lookback_days), {
+            "symbol": symbol,
+            "lookback_days": lookback_days
+        })
+    
+    def load_index_data(self, symbol: str, lookback_days: int, max_age_hours: int = 24) -> pd.DataFrame:
+        """加载指数行情，如果数据过期则返回None"""
+        df = self.load_frame(self._get_index_name(symbol, lookback_days), max_age_hours)
+        if df is not None:
+            df.index = pd.to_datetime(df.index)
+        return df
+    
+    def index_data_version(self, symbol: str, lookback_days: int) -> Optional[tuple]:
+        """指数行情缓存文件的版本"""
+        return self.frame_version(self._get_index_name(symbol, lookback_days))
@@ -0,0 +1,204 @@
+import concurrent.futures
+import threading
+import random
+import time
+import logging
+from typing import Callable, Dict, List, Any
+
+from ..instrumentation import span, count, submit_in_context
+
+
+class ThrottledError(Exception):
+    """请求被数据源限流（HTTP 429）"""
+
+
+def is_throttle_error(exc: Exception) -> bool:
+    """判断异常是否由限流引起"""
+    if isinstance(exc, ThrottledError):
+        return True
+    response = getattr(exc, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    # yfinance 的 YFRateLimitError 等
+    if 'RateLimit' in type(exc).__name__:
+        return True
+    message = str(exc)
+    return 'Too Many Requests' in message or 'Rate limited' in message
+
+
+class TokenBucket:
+    """令牌桶限速器，rate 为每秒补充的令牌数，capacity 为允许的突发请求数
+
+    recovery_rate 大于0时，降低后的速率每秒增加 recovery_rate，直到 max_rate。
+    """
+
+    def __init__(self, rate: float, capacity: float, max_rate: float = None, recovery_rate: float = 0.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_rate = max_rate or rate
+        self.recovery_rate = recovery_rate
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        rate = min(self.max_rate, self.rate + self.recovery_rate * elapsed) if self.rate < self.max_rate else self.rate
+        # 速率线性恢复期间按平均速率补充令牌
+        self.tokens = min(self.capacity, self.tokens + elapsed * (self.rate + rate) / 2)
+        self.rate = rate
+        self._updated = now
+
+    def acquire(self):
+        """取一个令牌，不足时等待"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # 速率恢复期间等待时间会缩短，分段等待后重新计算
+            time.sleep(min(wait, 0.25) if self.rate < self.max_rate else wait)
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+
+class FetchScheduler:
+    """自适应限速的抓取调度器
+
+    使用常驻线程池持续提交请求，不在批次之间空闲；通过令牌桶控制请求速率，
+    失败时按指数退避加随机抖动重试；并发数按AIMD策略调整：连续成功时加一，
+    遇到限流时减半，普通错误率过高时减一。限流时请求速率减半，此后按时间线性
+    恢复（每秒恢复 recovery_rate，默认 rate_limit/4）；throttle_cooldown 秒内的
+    多次限流视为同一次，同一批并发请求一起被限流时只减半一次。
+    """
+
+    def __init__(self, rate_limit: float = 5.0, burst: int = 10, min_concurrency: int = 1,
+                 max_concurrency: int = 16, initial_concurrency: int = 4, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, error_window: int = 20,
+                 recovery_rate: float = None, throttle_cooldown: float = 1.0):
+        self.max_rate = rate_limit
+        self.min_rate = rate_limit / 16
+        self.bucket = TokenBucket(rate_limit, burst, max_rate=rate_limit,
+                                  recovery_rate=recovery_rate or rate_limit / 4)
+        self.throttle_cooldown = throttle_cooldown
+        self._last_throttle = None
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = max(min_concurrency, min(initial_concurrency, max_concurrency))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.error_window = error_window
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+        self._slots = threading.Condition()
+        self._in_flight = 0
+        self._success_streak = 0
+        self._recent_errors = []
+        self.stats = {'requests': 0, 'successes': 0, 'errors': 0, 'throttled': 0, 'retries': 0}
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'FetchScheduler':
+        """从 data_source.scheduler 配置创建调度器"""
+        keys = ['rate_limit', 'burst', 'min_concurrency', 'max_concurrency', 'initial_concurrency',
+                'max_retries', 'backoff_base', 'backoff_max', 'error_window', 'recovery_rate',
+                'throttle_cooldown']
+        return cls(**{key: config[key] for key in keys if key in (config or {})})
+
+    def _acquire_slot(self):
+        with self._slots:
+            while self._in_flight >= self.concurrency:
+                self._slots.wait()
+            self._in_flight += 1
+            self.stats['requests'] += 1
+
+    def _release_slot(self):
+        with self._slots:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    def _record(self, failed: bool):
+        self._recent_errors.append(failed)
+        if len(self._recent_errors) > self.error_window:
+            self._recent_errors.pop(0)
+
+    def _on_success(self):
+        with self._slots:
+            self.stats['successes'] += 1
+            self._record(False)
+            self._success_streak += 1
+            if self._success_streak >= self.concurrency:
+                self._success_streak = 0
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                self._slots.notify_all()
+
+    def _on_failure(self, throttled: bool):
+        with self._slots:
+            self._success_streak = 0
+            self._record(True)
+            if throttled:
+                self.stats['throttled'] += 1
+                now = time.monotonic()
+                if self._last_throttle is None or now - self._last_throttle >= self.throttle_cooldown:
+                    self._last_throttle = now
+                    self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                    self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+            else:
+                self.stats['errors'] += 1
+                error_rate = sum(self._recent_errors) / len(self._recent_errors)
+                if error_rate > 0.5:
+                    self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+
+    def backoff_delay(self, attempt: int, throttled: bool = False) -> float:
+        """指数退避加抖动，限流时退避时间加倍"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt) * (2 if throttled else 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """在限速和并发限制下同步执行一次请求，失败时退避重试"""
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot()
+            try:
+                self.bucket.acquire()
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self._on_failure(throttled)
+                if attempt == self.max_retries:
+                    raise e
+                self.stats['retries'] += 1
+                delay = self.backoff_delay(attempt, throttled)
+                logging.warning(f"请求失败（第{attempt + 1}次），{delay:.1f}秒后重试: {e}")
+            else:
+                self._on_success()
+                return result
+            finally:
+                self._release_slot()
+            count('throttled' if throttled else 'retries')
+            with span('retry', attempt=attempt + 1, throttled=throttled):
+                time.sleep(delay)
+
+    def map(self, fn: Callable, items: List, progress_callback=None) -> Dict:
+        """对每个元素执行 fn，返回 {元素: 结果或异常}，通过 progress_callback 报告整体进度"""
+        futures = {submit_in_context(self._executor, fn, item): item for item in items}
+        results = {}
+        completed = 0
+        for future in concurrent.futures.as_completed(futures):
+            item = futures[future]
+            completed += 1
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                results[item] = e
+            if progress_callback:
+                progress_callback(completed / len(futures))
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,124 @@
+import pandas as pd
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, Optional, Hashable
+
+CacheEntry = namedtuple('CacheEntry', ['frame', 'meta', 'stored_at', 'nbytes'])
+
+
+class FrameCache:
+    """按DataFrame内存占用计量的LRU缓存，条目超过TTL后失效
+
+    max_bytes 为所有条目 memory_usage(deep=True) 之和的上限，超出时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, ttl_seconds: float = 3600, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'FrameCache':
+        """从 data_source 配置创建缓存：cache_duration（秒）和 cache_max_mb"""
+        config = config or {}
+        return cls(
+            max_bytes=int(config.get('cache_max_mb', 512) * 1024 * 1024),
+            ttl_seconds=config.get('cache_duration', 3600)
+        )
+
+    @staticmethod
+    def frame_bytes(frame: pd.DataFrame) -> int:
+        """DataFrame占用的内存字节数（含索引）"""
+        return int(frame.memory_usage(index=True, deep=True).sum())
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.nbytes
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """返回未过期的缓存数据，不存在或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self._clock() - entry.stored_at >= self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.frame
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """返回缓存条目（不论是否过期），由调用方通过 expired() 决定是否刷新"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def expired(self, entry: CacheEntry) -> bool:
+        """条目是否已超过TTL，超过时计入过期次数"""
+        is_expired = self._clock() - entry.stored_at >= self.ttl_seconds
+        if is_expired:
+            with self._lock:
+                self.expirations += 1
+        return is_expired
+
+    def put(self, key: Hashable, frame: pd.DataFrame, meta: Dict = None, stored_at: float = None):
+        """写入缓存，超出内存上限时按LRU淘汰；stored_at 用于保留原条目的写入时间"""
+        nbytes = self.frame_bytes(frame)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if nbytes > self.max_bytes:
+                return
+            stored_at = self._clock() if stored_at is None else stored_at
+            self._entries[key] = CacheEntry(frame, meta or {}, stored_at, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[pd.DataFrame]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            frame = self._entries[key].frame
+            self._remove(key)
+            return frame
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """命中、未命中、淘汰和过期次数，以及当前占用"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
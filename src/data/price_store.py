@@ -0,0 +1,189 @@
+import pandas as pd
+import numpy as np
+import os
+import logging
+from typing import List, Dict, Optional, Tuple
+
+
+class PriceStore:
+    """按股票存储OHLCV的列式价格库
+
+    每只股票一个 .npy 文件，内容为 float64 矩阵：第0列为自1970-01-01起的天数，
+    其余列依次为 FIELDS。读取时使用内存映射，按日期范围切片无需解析文本。
+    """
+
+    FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+    def __init__(self, store_dir: str = "cache/prices"):
+        self.store_dir = store_dir
+        self._ensure_store_dir()
+
+    def _ensure_store_dir(self):
+        """确保价格库目录存在"""
+        if not os.path.exists(self.store_dir):
+            os.makedirs(self.store_dir)
+
+    def _get_path(self, symbol: str) -> str:
+        """获取股票价格文件路径"""
+        return os.path.join(self.store_dir, f"{symbol}.npy")
+
+    @staticmethod
+    def _to_epoch_days(index: pd.DatetimeIndex) -> np.ndarray:
+        """把日期索引转换为交易所本地日期对应的天数"""
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        return index.values.astype('datetime64[D]').astype(np.int64)
+
+    @staticmethod
+    def _to_epoch_day(date: Optional[pd.Timestamp]) -> int:
+        timestamp = pd.Timestamp(date)
+        if timestamp.tz is not None:
+            timestamp = timestamp.tz_localize(None)
+        return int(np.datetime64(timestamp.normalize(), 'D').astype(np.int64))
+
+    @staticmethod
+    def _to_index(days: np.ndarray) -> pd.DatetimeIndex:
+        index = pd.DatetimeIndex(days.astype(np.int64).astype('datetime64[D]').astype('datetime64[ns]'))
+        index.name = 'Date'
+        return index
+
+    def has(self, symbol: str) -> bool:
+        return os.path.exists(self._get_path(symbol))
+
+    def list_symbols(self) -> List[str]:
+        """列出价格库中的所有股票"""
+        return sorted(name[:-4] for name in os.listdir(self.store_dir) if name.endswith('.npy'))
+
+    def _load_matrix(self, symbol: str) -> Optional[np.ndarray]:
+        path = self._get_path(symbol)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def _slice(self, matrix: np.ndarray, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> np.ndarray:
+        """按日期范围切片（包含两端）"""
+        days = matrix[:, 0]
+        lo = 0 if start is None else int(np.searchsorted(days, self._to_epoch_day(start), side='left'))
+        hi = len(days) if end is None else int(np.searchsorted(days, self._to_epoch_day(end), side='right'))
+        return matrix[lo:hi]
+
+    def write(self, symbol: str, df: pd.DataFrame):
+        """覆盖写入一只股票的价格数据"""
+        days = self._to_epoch_days(pd.DatetimeIndex(df.index))
+        matrix = np.full((len(df), len(self.FIELDS) + 1), np.nan, dtype=np.float64)
+        matrix[:, 0] = days
+        for i, field in enumerate(self.FIELDS, start=1):
+            if field in df.columns:
+                matrix[:, i] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=np.float64)
+
+        # 按日期排序并去重，同一天保留最后一条
+        order = np.argsort(days, kind='stable')
+        matrix = matrix[order]
+        keep = np.append(matrix[1:, 0] != matrix[:-1, 0], True) if len(matrix) else np.array([], dtype=bool)
+        matrix = matrix[keep]
+
+        # 先写临时文件再替换，避免读取到写了一半的文件
+        path = self._get_path(symbol)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp_path, path)
+
+    def append(self, symbol: str, df: pd.DataFrame):
+        """合并新数据，同一天以新数据为准"""
+        existing = self.read(symbol)
+        if existing.empty:
+            self.write(symbol, df)
+            return
+        new_df = df.reindex(columns=self.FIELDS)
+        new_df.index = self._to_index(self._to_epoch_days(pd.DatetimeIndex(df.index)))
+        self.write(symbol, pd.concat([existing, new_df]))
+
+    def date_range(self, symbol: str) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        """价格库中该股票的首尾日期"""
+        matrix = self._load_matrix(symbol)
+        if matrix is None or len(matrix) == 0:
+            return None, None
+        first, last = self._to_index(np.array([matrix[0, 0], matrix[-1, 0]]))
+        return first, last
+
+    def read(self, symbol: str, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """读取一只股票在日期范围内的OHLCV数据"""
+        matrix = self._load_matrix(symbol)
+        if matrix is None:
+            return pd.DataFrame(columns=self.FIELDS)
+        rows = self._slice(matrix, start, end)
+        return pd.DataFrame(np.array(rows[:, 1:]), index=self._to_index(rows[:, 0]), columns=self.FIELDS)
+
+    def load_panel(self, symbols: List[str], field: str = 'Close',
+                   start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """批量读取多只股票的同一字段，对齐为日期×股票矩阵"""
+        column = self.FIELDS.index(field) + 1
+        days_list = []
+        values_list = []
+        loaded = []
+        for symbol in symbols:
+            matrix = self._load_matrix(symbol)
+            if matrix is None:
+                continue
+            rows = self._slice(matrix, start, end)
+            days_list.append(np.asarray(rows[:, 0], dtype=np.int64))
+            values_list.append(np.asarray(rows[:, column]))
+            loaded.append(symbol)
+
+        if not loaded:
+            return pd.DataFrame(dtype=float)
+
+        all_days = np.unique(np.concatenate(days_list))
+        panel = np.full((len(all_days), len(loaded)), np.nan, dtype=np.float64)
+        for j, (days, values) in enumerate(zip(days_list, values_list)):
+            panel[np.searchsorted(all_days, days), j] = values
+
+        return pd.DataFrame(panel, index=self._to_index(all_days), columns=loaded)
+
+    def load_frames(self, symbols: List[str],
+                    start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> Dict[str, pd.DataFrame]:
+        """批量读取多只股票的完整OHLCV数据"""
+        frames = {}
+        for symbol in symbols:
+            df = self.read(symbol, start, end)
+            if not df.empty:
+                frames[symbol] = df
+        return frames
+
+    @staticmethod
+    def read_yfinance_csv(path: str) -> pd.DataFrame:
+        """读取yfinance导出的三行表头CSV（Price/Ticker/Date）"""
+        with open(path, 'r', encoding='utf-8') as f:
+            header = [f.readline() for _ in range(3)]
+        if not (header[0].startswith('Price,') and header[1].startswith('Ticker,')):
+            return None
+
+        df = pd.read_csv(path, skiprows=[1, 2], index_col=0)
+        df.index = pd.to_datetime(df.index.str[:10])
+        df.index.name = 'Date'
+        return df
+
+    def migrate_csv_cache(self, csv_dir: str = "cache") -> List[str]:
+        """一次性把cache目录下yfinance格式的CSV迁移到价格库"""
+        migrated = []
+        for name in sorted(os.listdir(csv_dir)):
+            if not name.endswith('.csv'):
+                continue
+            path = os.path.join(csv_dir, name)
+            try:
+                df = self.read_yfinance_csv(path)
+                if df is None:
+                    continue
+                self.write(name[:-4], df)
+                migrated.append(name[:-4])
+            except Exception as e:
+                logging.error(f"迁移价格文件 {name} 失败: {e}")
+
+        logging.info(f"已迁移 {len(migrated)} 只股票的价格数据到 {self.store_dir}")
+        return migrated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    PriceStore().migrate_csv_cache()
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ..instrumentation import span, count
+
+# 每个字节中1的个数，用于没有 np.bitwise_count 的numpy版本
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount_rows(packed: np.ndarray) -> np.ndarray:
+    """按行统计位压缩矩阵中1的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(packed).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT_TABLE[packed].sum(axis=1, dtype=np.int64)
+
+
+class SignalStore:
+    """按股票位压缩存储的“收盘价位于均线之上”信号矩阵
+
+    每个指数、每个均线周期一个文件，保存对齐到日期后的 above（位于均线之上且有效）
+    和 valid（K线数量足以计算均线）两个 日期×股票 布尔矩阵，沿股票方向用
+    np.packbits 压缩为每行 ceil(股票数/8) 个字节。任意股票子集、样本数量和回溯期
+    的市场宽度只需对掩码做按位与和popcount，不需要重新计算均线。
+
+    每只股票另外记录已计算的日期区间（first_day/last_day）。小样本的计算按
+    (股票, 日期) 合并进已有矩阵，只刷新这些股票；其他股票的区间不变，查询超出
+    区间的日期时视为未命中，不会把未刷新的格子当作无效数据统计。
+    """
+
+    def __init__(self, store_dir: str = "cache/signals"):
+        self.store_dir = store_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _path(self, universe: str, ma_period: int) -> str:
+        return os.path.join(self.store_dir, f"{universe}_ma{ma_period}.npz")
+
+    @staticmethod
+    def _to_days(dates) -> np.ndarray:
+        return pd.DatetimeIndex(dates).values.astype('datetime64[D]').astype(np.int64)
+
+    def _merge(self, data: Dict, above: pd.DataFrame, valid: pd.DataFrame) -> Tuple:
+        """把新矩阵按 (股票, 日期) 合并进已保存的矩阵，重叠的格子以新矩阵为准"""
+        symbols = list(dict.fromkeys(data['symbols'] + list(above.columns)))
+        days = np.union1d(data['dates'], self._to_days(above.index))
+        old_rows = np.searchsorted(days, data['dates'])
+        new_rows = np.searchsorted(days, self._to_days(above.index))
+        old_columns = np.arange(len(data['symbols']))
+        positions = {symbol: i for i, symbol in enumerate(symbols)}
+        new_columns = np.array([positions[symbol] for symbol in above.columns], dtype=np.int64)
+
+        merged = []
+        for name, frame in (('above', above), ('valid', valid)):
+            matrix = np.zeros((len(days), len(symbols)), dtype=bool)
+            old = np.unpackbits(data[name], axis=1, count=len(data['symbols'])).astype(bool)
+            matrix[np.ix_(old_rows, old_columns)] = old
+            matrix[np.ix_(new_rows, new_columns)] = frame.to_numpy(dtype=bool)
+            merged.append(matrix)
+
+        # 新计算的区间与原区间之间没有其他日期时取并集，否则只保留新区间（中间的日期没有这只股票的数据）
+        first_day = np.full(len(symbols), np.iinfo(np.int64).max, dtype=np.int64)
+        last_day = np.full(len(symbols), np.iinfo(np.int64).min, dtype=np.int64)
+        first_day[old_columns], last_day[old_columns] = data['first_day'], data['last_day']
+        new_first, new_last = days[new_rows].min(), days[new_rows].max()
+        old_first, old_last = first_day[new_columns], last_day[new_columns]
+        gap_start, gap_end = np.minimum(old_last, new_last), np.maximum(old_first, new_first)
+        gap_rows = np.searchsorted(days, gap_end, 'left') - np.searchsorted(days, gap_start, 'right')
+        joined = (gap_end <= gap_start) | (gap_rows <= 0)
+        first_day[new_columns] = np.where(joined, np.minimum(old_first, new_first), new_first)
+        last_day[new_columns] = np.where(joined, np.maximum(old_last, new_last), new_last)
+        return merged[0], merged[1], days, symbols, first_day, last_day
+
+    def write(self, universe: str, ma_period: int, above: pd.DataFrame, valid: pd.DataFrame,
+              replace: bool = True) -> bool:
+        """保存对齐到日期后的信号矩阵，先写临时文件再替换
+
+        replace为True时用新矩阵替换已保存的矩阵（预计算按最大样本和最长回溯期重建）；
+        为False时按 (股票, 日期) 合并进已保存的矩阵，小样本的计算只刷新自己的股票，
+        不会丢掉其他股票。返回是否写入。
+        """
+        if above.empty:
+            return False
+        data = None if replace else self.load(universe, ma_period, max_age_hours=None)
+        if data is None:
+            days = self._to_days(above.index)
+            above_values, valid_values = above.to_numpy(dtype=bool), valid.to_numpy(dtype=bool)
+            symbols = list(above.columns)
+            first_day = np.full(len(symbols), days.min(), dtype=np.int64)
+            last_day = np.full(len(symbols), days.max(), dtype=np.int64)
+        else:
+            above_values, valid_values, days, symbols, first_day, last_day = self._merge(data, above, valid)
+
+        path = self._path(universe, ma_period)
+        with span('signal_save', universe=universe, ma_period=ma_period, symbols=len(symbols)):
+            with open(f"{path}.tmp", 'wb') as f:
+                np.savez(
+                    f,
+                    above=np.packbits(above_values, axis=1),
+                    valid=np.packbits(valid_values, axis=1),
+                    dates=days,
+                    symbols=np.array(symbols, dtype=str),
+                    first_day=first_day,
+                    last_day=last_day,
+                    last_update=np.array(datetime.now().isoformat())
+                )
+            os.replace(f"{path}.tmp", path)
+        with self._lock:
+            self._cache.pop(path, None)
+        return True
+
+    def load(self, universe: str, ma_period: int, max_age_hours: Optional[int] = 24) -> Optional[Dict]:
+        """读取信号矩阵，不存在或过期时返回None；按文件修改时间缓存在内存中"""
+        path = self._path(universe, ma_period)
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached is None or cached['mtime'] != mtime:
+            try:
+                with np.load(path) as data:
+                    symbols = data['symbols'].tolist()
+                    dates = data['dates']
+                    # 没有区间记录的旧文件视为所有股票覆盖全部日期
+                    default_first = dates.min() if len(dates) else 0
+                    default_last = dates.max() if len(dates) else 0
+                    cached = {
+                        'mtime': mtime,
+                        'above': data['above'],
+                        'valid': data['valid'],
+                        'dates': dates,
+                        'first_day': data['first_day'] if 'first_day' in data.files
+                        else np.full(len(symbols), default_first, dtype=np.int64),
+                        'last_day': data['last_day'] if 'last_day' in data.files
+                        else np.full(len(symbols), default_last, dtype=np.int64),
+                        'symbols': symbols,
+                        'positions': {symbol: i for i, symbol in enumerate(symbols)},
+                        'last_update': datetime.fromisoformat(str(data['last_update']))
+                    }
+            except Exception as e:
+                logging.error(f"加载信号矩阵失败: {e}")
+                return None
+            with self._lock:
+                self._cache[path] = cached
+
+        if max_age_hours is not None and datetime.now() - cached['last_update'] > timedelta(hours=max_age_hours):
+            return None
+        return cached
+
+    def symbols(self, universe: str, ma_period: int) -> List[str]:
+        """已保存的股票列表（不检查是否过期）"""
+        data = self.load(universe, ma_period, max_age_hours=None)
+        return data['symbols'] if data is not None else []
+
+    def counts(self, universe: str, ma_period: int, symbols: List[str], dates: pd.DatetimeIndex,
+               max_age_hours: Optional[int] = 24,
+               members: pd.DataFrame = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """计算股票子集在各日期位于均线之上的数量和有效数量
+
+        members 为 日期×股票 的成分股矩阵时，每个日期只统计当日在指数中的股票。
+        信号矩阵不存在、过期、缺少其中的股票或日期，或者其中的股票没有计算到这些日期时返回None。
+        """
+        data = self.load(universe, ma_period, max_age_hours)
+        if data is None:
+            count('signal_miss')
+            return None
+
+        positions = [data['positions'].get(symbol) for symbol in symbols]
+        days = self._to_days(dates)
+        rows = np.searchsorted(data['dates'], days)
+        if (any(position is None for position in positions)
+                or (rows >= len(data['dates'])).any()
+                or (data['dates'][np.minimum(rows, len(data['dates']) - 1)] != days).any()
+                or (len(days) and ((data['first_day'][positions] > days.min()).any()
+                                   or (data['last_day'][positions] < days.max()).any()))):
+            count('signal_miss')
+            return None
+
+        mask = np.zeros(len(data['symbols']), dtype=bool)
+        mask[positions] = True
+        if members is None:
+            packed_mask = np.packbits(mask)
+        else:
+            member_rows = members.reindex(index=dates, columns=data['symbols'], fill_value=False)
+            packed_mask = np.packbits(member_rows.to_numpy(dtype=bool) & mask[None, :], axis=1)
+        count('signal_hit')
+        return (popcount_rows(data['above'][rows] & packed_mask),
+                popcount_rows(data['valid'][rows] & packed_mask))
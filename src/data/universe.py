@@ -0,0 +1,238 @@
+import pandas as pd
+import numpy as np
+import io
+import logging
+import requests
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .data_storage import DataStorage
+from ..instrumentation import span
+
+# 未知的纳入日期视为一直在指数中，未剔除的股票视为仍在指数中
+_MIN_DAY = np.iinfo(np.int64).min
+_MAX_DAY = np.iinfo(np.int64).max
+
+
+def to_yahoo_symbol(symbol: str) -> str:
+    """维基百科等来源使用 BRK.B 格式，yfinance 使用 BRK-B"""
+    return str(symbol).strip().replace('.', '-')
+
+
+class UniverseManager:
+    """指数成分股管理
+
+    把成分股表（代码、名称、行业、纳入日期、剔除日期）持久化到本地，超过
+    refresh_hours 才重新下载，离线时使用本地已有的表。内存中的表同样超过
+    refresh_hours 或为空时重新加载，常驻进程不会一直使用启动时的表。每只股票的
+    纳入/剔除区间在内存中建成数组索引，用于按日期查询历史成分股。
+    """
+
+    COLUMNS = ['symbol', 'name', 'sector', 'added', 'removed']
+
+    def __init__(self, config: Dict, cache_dir: str = "cache/universe", refresh_hours: Optional[int] = None,
+                 clock=time.monotonic):
+        self.config = config or {}
+        self.storage = DataStorage(cache_dir)
+        self.refresh_hours = refresh_hours or self.config.get('universe', {}).get('refresh_hours', 24)
+        self._clock = clock
+        self._tables = {}
+        self._indexes = {}
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def _index_config(self, index_name: str) -> Dict:
+        return self.config.get('indices', {}).get(index_name, {})
+
+    # ---- 数据源解析 ----
+
+    def _parse_sp500(self, url: str) -> pd.DataFrame:
+        """解析维基百科的标普500成分股表和历史变动表"""
+        tables = pd.read_html(url)
+        current = tables[0]
+        table = pd.DataFrame({
+            'symbol': current['Symbol'].map(to_yahoo_symbol),
+            'name': current['Security'],
+            'sector': current['GICS Sector'],
+            'added': pd.to_datetime(current['Date added'], errors='coerce'),
+            'removed': pd.NaT
+        })
+        if len(tables) < 2:
+            return table
+
+        # 历史变动表：每次剔除形成一个区间，起点为此前最近一次纳入
+        changes = tables[1]
+        changes.columns = [' '.join(dict.fromkeys(col)) if isinstance(col, tuple) else col
+                           for col in changes.columns]
+        date_column = next(col for col in changes.columns if 'Date' in col)
+        events = pd.DataFrame({
+            'date': pd.to_datetime(changes[date_column], errors='coerce'),
+            'added': changes.get('Added Ticker'),
+            'removed': changes.get('Removed Ticker'),
+            'removed_name': changes.get('Removed Security')
+        }).dropna(subset=['date']).sort_values('date')
+
+        intervals = []
+        for row in events.dropna(subset=['removed']).itertuples():
+            symbol = to_yahoo_symbol(row.removed)
+            added_events = events[(events['added'].map(to_yahoo_symbol, na_action='ignore') == symbol)
+                                  & (events['date'] < row.date)]
+            intervals.append({
+                'symbol': symbol,
+                'name': row.removed_name,
+                'sector': None,
+                'added': added_events['date'].max() if not added_events.empty else pd.NaT,
+                'removed': row.date
+            })
+
+        if intervals:
+            table = pd.concat([table, pd.DataFrame(intervals, columns=self.COLUMNS)], ignore_index=True)
+        return table
+
+    def _parse_wikipedia_components(self, url: str) -> pd.DataFrame:
+        """解析维基百科的成分股表（纳斯达克100等，没有纳入日期）"""
+        for current in pd.read_html(url):
+            symbol_column = next((col for col in ('Ticker', 'Symbol') if col in current.columns), None)
+            if symbol_column is None or 'GICS Sector' not in current.columns:
+                continue
+            name_column = next((col for col in ('Company', 'Security') if col in current.columns), symbol_column)
+            return pd.DataFrame({
+                'symbol': current[symbol_column].map(to_yahoo_symbol),
+                'name': current[name_column],
+                'sector': current['GICS Sector'],
+                'added': pd.NaT,
+                'removed': pd.NaT
+            })
+        raise ValueError(f"未找到成分股表: {url}")
+
+    def _parse_ishares_holdings(self, url: str) -> pd.DataFrame:
+        """解析iShares ETF持仓CSV（罗素2000使用IWM持仓）"""
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        lines = response.text.splitlines()
+        header_row = next(i for i, line in enumerate(lines) if line.startswith('Ticker,'))
+        holdings = pd.read_csv(io.StringIO('\n'.join(lines[header_row:])))
+        holdings = holdings[holdings['Asset Class'] == 'Equity']
+        return pd.DataFrame({
+            'symbol': holdings['Ticker'].map(to_yahoo_symbol),
+            'name': holdings['Name'],
+            'sector': holdings['Sector'],
+            'added': pd.NaT,
+            'removed': pd.NaT
+        })
+
+    def _download(self, index_name: str) -> pd.DataFrame:
+        """按配置的数据源下载成分股表"""
+        index_config = self._index_config(index_name)
+        url = index_config.get('components_url')
+        source = index_config.get('components_source', 'wikipedia')
+        if not url:
+            raise ValueError(f"指数 {index_name} 未配置 components_url")
+
+        if index_name == 'SP500':
+            table = self._parse_sp500(url)
+        elif source == 'ishares':
+            table = self._parse_ishares_holdings(url)
+        else:
+            table = self._parse_wikipedia_components(url)
+        return table[self.COLUMNS].reset_index(drop=True)
+
+    # ---- 持久化与刷新 ----
+
+    def _load_table(self, name: str, max_age_hours: Optional[int]) -> Optional[pd.DataFrame]:
+        table = self.storage.load_frame(name, max_age_hours)
+        if table is None:
+            return None
+        for column in ('added', 'removed'):
+            table[column] = pd.to_datetime(table[column])
+        return table
+
+    def refresh(self, index_name: str, force: bool = False) -> pd.DataFrame:
+        """本地表超过 refresh_hours 时重新下载，下载失败时继续使用本地表"""
+        if not force:
+            table = self._load_table(index_name, self.refresh_hours)
+            if table is not None:
+                return self._set_table(index_name, table)
+
+        try:
+            with span('universe_download', index=index_name):
+                table = self._download(index_name)
+            self.storage.save_frame(table, index_name, {"index": index_name, "count": len(table)})
+            logging.info(f"已更新 {index_name} 成分股，共 {len(table)} 条记录")
+        except Exception as e:
+            logging.error(f"获取 {index_name} 成分股失败: {e}")
+            table = self._load_table(index_name, None)
+            if table is None:
+                table = pd.DataFrame(columns=self.COLUMNS)
+            else:
+                logging.info(f"使用本地缓存的 {index_name} 成分股")
+        return self._set_table(index_name, table)
+
+    def _set_table(self, index_name: str, table: pd.DataFrame) -> pd.DataFrame:
+        """保存成分股表并建立纳入/剔除日期索引"""
+        with self._lock:
+            self._tables[index_name] = table
+            self._loaded_at[index_name] = self._clock()
+            self._indexes[index_name] = (
+                table['symbol'].to_numpy(dtype=object),
+                self._to_days(table['added'], _MIN_DAY),
+                self._to_days(table['removed'], _MAX_DAY)
+            )
+        return table
+
+    @staticmethod
+    def _to_days(dates: pd.Series, missing: int) -> np.ndarray:
+        values = pd.to_datetime(dates).to_numpy(dtype='datetime64[D]')
+        days = values.astype(np.int64)
+        days[np.isnat(values)] = missing
+        return days
+
+    def _needs_reload(self, index_name: str) -> bool:
+        """内存中没有该指数的表、表为空，或加载时间超过 refresh_hours"""
+        with self._lock:
+            table = self._tables.get(index_name)
+            loaded_at = self._loaded_at.get(index_name)
+        if table is None or table.empty:
+            return True
+        return self._clock() - loaded_at >= self.refresh_hours * 3600
+
+    def get_table(self, index_name: str = 'SP500') -> pd.DataFrame:
+        """获取成分股表，首次调用、表为空或超过 refresh_hours 时从本地重新加载或下载"""
+        if self._needs_reload(index_name):
+            self.refresh(index_name)
+        return self._tables[index_name]
+
+    # ---- 查询 ----
+
+    def get_members(self, index_name: str = 'SP500') -> List[str]:
+        """当前成分股列表（保持数据源中的顺序）"""
+        table = self.get_table(index_name)
+        return table.loc[table['removed'].isna(), 'symbol'].drop_duplicates().tolist()
+
+    def members_as_of(self, index_name: str, date) -> List[str]:
+        """指定日期的成分股列表"""
+        self.get_table(index_name)
+        symbols, added, removed = self._indexes[index_name]
+        day = int(np.datetime64(pd.Timestamp(date).normalize().tz_localize(None), 'D').astype(np.int64))
+        mask = (added <= day) & (day < removed)
+        return list(dict.fromkeys(symbols[mask]))
+
+    def membership_matrix(self, index_name: str, dates: pd.DatetimeIndex, symbols: List[str] = None) -> pd.DataFrame:
+        """日期×股票的成分股矩阵，用于在历史市场宽度中按当时的成分股统计"""
+        self.get_table(index_name)
+        table_symbols, added, removed = self._indexes[index_name]
+        days = pd.DatetimeIndex(dates).tz_localize(None).normalize().to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+        # 每个区间一列，同一股票的多个区间取并集
+        in_interval = (added[None, :] <= days[:, None]) & (days[:, None] < removed[None, :])
+        membership = pd.DataFrame(in_interval, index=dates, columns=table_symbols)
+        membership = membership.T.groupby(level=0, sort=False).any().T
+        if symbols is not None:
+            membership = membership.reindex(columns=symbols, fill_value=False)
+        return membership
+
+    def get_sectors(self, index_name: str = 'SP500') -> Dict[str, str]:
+        """股票代码到行业的映射"""
+        table = self.get_table(index_name).dropna(subset=['sector'])
+        return dict(zip(table['symbol'], table['sector']))
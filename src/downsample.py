@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """最大三角形三桶（LTTB）降采样，返回保留点的下标
+
+    首尾两点固定保留，中间的点分成 threshold-2 个桶，每个桶选出与前一个保留点
+    和下一个桶平均点组成的三角形面积最大的点，能保留曲线的峰谷形状。
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bounds = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = bounds[i], bounds[i + 1]
+        # 下一个桶的平均点，最后一个桶使用末尾点
+        next_start, next_stop = stop, bounds[i + 2] if i + 2 < len(bounds) else n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+
+        areas = np.abs((x[previous] - avg_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (avg_y - y[previous]))
+        previous = start + int(np.nanargmax(areas)) if not np.all(np.isnan(areas)) else start
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """按桶保留最小值和最大值的降采样，返回保留点的下标（按原顺序）"""
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = threshold // 2
+    bounds = np.linspace(0, n, n_buckets + 1).astype(int)
+    filled = np.where(np.isnan(y), np.nanmean(y), y)
+    selected = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if stop <= start:
+            continue
+        bucket = filled[start:stop]
+        selected.extend(sorted({start + int(bucket.argmin()), start + int(bucket.argmax())}))
+    return np.asarray(selected, dtype=np.int64)
+
+
+def downsample(frame: pd.DataFrame, x: str, y: str, max_points: int, method: str = 'lttb') -> pd.DataFrame:
+    """按 max_points 对数据表降采样，x 为日期列名（或 'index' 表示使用索引），y 为数值列名"""
+    if max_points is None or len(frame) <= max_points:
+        return frame
+    x_values = frame.index if x == 'index' else frame[x]
+    x_numeric = pd.DatetimeIndex(x_values).asi8.astype(np.float64)
+    y_values = frame[y].to_numpy(dtype=np.float64)
+    if method == 'minmax':
+        indices = minmax_indices(y_values, max_points)
+    else:
+        indices = lttb_indices(x_numeric, y_values, max_points)
+    return frame.iloc[indices]
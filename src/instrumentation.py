@@ -0,0 +1,141 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+# 结构化性能日志单独使用一个logger，可以按需重定向或关闭
+perf_logger = logging.getLogger("market_breadth.perf")
+
+
+class Run:
+    """一次分析运行中记录的耗时区间和计数"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now().isoformat()
+        self._started = time.perf_counter()
+        self.seconds = None
+        self.spans: List[Dict] = []
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float, attrs: Dict):
+        with self._lock:
+            self.spans.append({'name': name, 'seconds': seconds, **attrs})
+
+    def add_count(self, name: str, value: int):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._started
+
+    def breakdown(self) -> List[Dict]:
+        """按区间名称汇总：次数、总耗时、最长耗时，按总耗时降序"""
+        with self._lock:
+            spans = list(self.spans)
+        summary = {}
+        for span in spans:
+            row = summary.setdefault(span['name'], {'name': span['name'], 'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            row['count'] += 1
+            row['seconds'] += span['seconds']
+            row['max_seconds'] = max(row['max_seconds'], span['seconds'])
+        return sorted(summary.values(), key=lambda row: row['seconds'], reverse=True)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'run': self.name,
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'stages': self.breakdown(),
+            'counters': counters
+        }
+
+
+class Instrumentation:
+    """记录各阶段耗时（获取、重试、缓存命中/未命中、计算、渲染）和计数
+
+    区间和计数写入当前运行，同时以JSON格式输出到 market_breadth.perf 日志。
+    当前运行保存在 ContextVar 中，每个线程（每个会话）各自独立；提交到线程池的任务
+    需要通过 submit_in_context 携带提交方的上下文，其中的记录才会计入同一个运行。
+    没有进行中的运行时只输出日志。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = contextvars.ContextVar('instrumentation_run', default=None)
+        self._last: Run = None
+
+    def _emit(self, event: Dict):
+        if perf_logger.isEnabledFor(logging.INFO):
+            perf_logger.info(json.dumps(event, ensure_ascii=False, default=str))
+
+    def start_run(self, name: str) -> Run:
+        run = Run(name)
+        self._current.set(run)
+        return run
+
+    def end_run(self) -> Run:
+        """结束当前上下文中的运行，不影响其他线程或会话的运行"""
+        run = self._current.get()
+        self._current.set(None)
+        if run is not None:
+            run.finish()
+            with self._lock:
+                self._last = run
+            self._emit({'event': 'run', **run.to_dict()})
+        return run
+
+    @contextmanager
+    def run(self, name: str):
+        """把一次分析的所有记录归入同一个运行"""
+        run = self.start_run(name)
+        try:
+            yield run
+        finally:
+            self.end_run()
+
+    def last_run(self) -> Run:
+        """最近一次完成的运行"""
+        return self._last
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """记录代码块的耗时，异常时标记 error"""
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            if error:
+                attrs['error'] = error
+            run = self._current.get()
+            if run is not None:
+                run.add_span(name, seconds, attrs)
+            self._emit({'event': 'span', 'name': name, 'ms': round(seconds * 1000, 3), **attrs})
+
+    def count(self, name: str, value: int = 1):
+        """累加计数（获取成功/失败的股票数、缓存命中次数等）"""
+        run = self._current.get()
+        if run is not None:
+            run.add_count(name, value)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """在提交方的上下文副本中执行任务，使工作线程的记录计入提交方的运行"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+instrumentation = Instrumentation()
+span = instrumentation.span
+count = instrumentation.count
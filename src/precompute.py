@@ -0,0 +1,186 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+from .data.data_fetcher import DataFetcher
+from .data.backends import MARKET_TZ
+from .analysis.market_breadth import MarketBreadth
+
+DEFAULT_STATUS_PATH = "cache/precompute_status.json"
+
+
+def load_status(status_path: str = DEFAULT_STATUS_PATH) -> Dict:
+    """读取最近一次预计算的状态，不存在时返回None"""
+    if not os.path.exists(status_path):
+        return None
+    try:
+        with open(status_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"读取预计算状态失败: {e}")
+        return None
+
+
+class PrecomputeScheduler:
+    """收盘后预计算所有配置的市场宽度组合
+
+    每个指数的成分股行情只刷新一次，之后各组合的计算都命中内存中的行情缓存；
+    结果写入 DataStorage，页面只需读取缓存。每次运行后写出状态文件，记录
+    运行时间、耗时和获取失败的股票。
+    """
+
+    def __init__(self, data_fetcher: DataFetcher = None, config: Dict = None):
+        self.data_fetcher = data_fetcher or DataFetcher()
+        self.market_breadth = MarketBreadth(self.data_fetcher)
+        app_config = self.data_fetcher.config or {}
+        config = config or app_config.get('precompute', {})
+
+        self.indices = config.get('indices') or list(app_config.get('indices', {}).keys())
+        self.sample_sizes = config.get('sample_sizes', [30])
+        self.lookback_days = config.get('lookback_days', [30, 90, 180, 365, 730])
+        self.ma_periods = app_config.get('moving_averages', [21, 63, 127])
+        # 热力图的扫描周期加上回测网格的周期，页面和回测都从这一份扫描缓存中取所需的周期
+        self.sweep_periods = sorted(set(self.market_breadth.get_sweep_periods())
+                                    | set(self.market_breadth.get_backtest_grid()['periods']))
+        self.run_after = config.get('run_after', "16:30")
+        self.status_path = config.get('status_path', DEFAULT_STATUS_PATH)
+
+    def _index_symbol(self, index_name: str) -> str:
+        return self.data_fetcher.config.get('indices', {}).get(index_name, {}).get('symbol')
+
+    def _write_status(self, status: Dict):
+        """先写临时文件再替换，页面不会读到写了一半的状态"""
+        directory = os.path.dirname(self.status_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.status_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(f"{self.status_path}.tmp", self.status_path)
+
+    def refresh_prices(self, symbols: List[str]) -> List[str]:
+        """按最长回溯期加最长均线周期（含扫描周期）刷新一次行情，返回获取失败的股票"""
+        period = max(self.lookback_days) + max(list(self.ma_periods) + self.sweep_periods + [127])
+        data = self.data_fetcher.get_stock_data_bulk(symbols, period)
+        return [symbol for symbol in symbols if symbol not in data]
+
+    def _variants(self, index_name: str, components: List[str]):
+        """生成 (名称, 计算函数) 组合：各均线的信号矩阵，以及各样本数 × 回溯期 × (各均线 + 多头排列 + 均线扫描)"""
+        sample_sizes = sorted({min(size, len(components)) for size in self.sample_sizes})
+        # 最大样本数和最长回溯期的信号矩阵可以覆盖页面上任意样本数量和回溯期
+        for ma_period in self.ma_periods:
+            yield (f"{index_name} signals ma{ma_period}",
+                   lambda m=ma_period:
+                   self.market_breadth.build_signal_matrix(
+                       components[:sample_sizes[-1]], m, max(self.lookback_days), universe=index_name,
+                       replace=True)[0])
+        for sample_size in sample_sizes:
+            symbols = components[:sample_size]
+            for lookback_days in self.lookback_days:
+                for ma_period in self.ma_periods:
+                    yield (f"{index_name} n{sample_size} d{lookback_days} ma{ma_period}",
+                           lambda s=symbols, m=ma_period, d=lookback_days:
+                           self.market_breadth.calculate_historical_breadth(
+                               s, m, d, universe=index_name, use_cache=False))
+                yield (f"{index_name} n{sample_size} d{lookback_days} bullish",
+                       lambda s=symbols, d=lookback_days:
+                       self.market_breadth.calculate_historical_bullish_alignment(
+                           s, d, universe=index_name, use_cache=False))
+                yield (f"{index_name} n{sample_size} d{lookback_days} sweep",
+                       lambda s=symbols, d=lookback_days:
+                       self.market_breadth.calculate_ma_sweep(
+                           s, self.sweep_periods, d, universe=index_name, use_cache=False))
+
+        index_symbol = self._index_symbol(index_name)
+        if index_symbol:
+            for lookback_days in self.lookback_days:
+                yield (f"{index_name} index d{lookback_days}",
+                       lambda d=lookback_days:
+                       self.market_breadth.get_index_data(d, index_symbol, use_cache=False))
+
+    def run_once(self) -> Dict:
+        """执行一次完整的预计算并写出状态文件"""
+        started = time.time()
+        status = {
+            'last_run_start': datetime.now().isoformat(),
+            'status': 'running',
+            'indices': {}
+        }
+        self._write_status(status)
+
+        for index_name in self.indices:
+            index_status = {'variants': 0, 'failed_variants': [], 'failed_symbols': []}
+            status['indices'][index_name] = index_status
+            try:
+                components = self.data_fetcher.get_components(index_name)
+                if not components:
+                    raise ValueError("成分股列表为空")
+                logging.info(f"预计算 {index_name}：刷新 {len(components[:max(self.sample_sizes)])} 只股票的行情")
+                index_status['failed_symbols'] = self.refresh_prices(components[:max(self.sample_sizes)])
+
+                for name, compute in self._variants(index_name, components):
+                    try:
+                        result = compute()
+                        if result is None or result.empty:
+                            raise ValueError("结果为空")
+                        index_status['variants'] += 1
+                    except Exception as e:
+                        logging.error(f"预计算 {name} 失败: {e}")
+                        index_status['failed_variants'].append(name)
+            except Exception as e:
+                logging.error(f"预计算 {index_name} 失败: {e}")
+                index_status['error'] = str(e)
+
+        failed = any(s.get('error') or s['failed_variants'] for s in status['indices'].values())
+        status.update({
+            'last_run_end': datetime.now().isoformat(),
+            'duration_seconds': round(time.time() - started, 2),
+            'status': 'partial' if failed else 'success'
+        })
+        self._write_status(status)
+        logging.info(f"预计算完成，耗时 {status['duration_seconds']} 秒，状态: {status['status']}")
+        return status
+
+    def next_run_time(self, now: pd.Timestamp = None) -> pd.Timestamp:
+        """下一个收盘后的运行时间（美国东部时间）"""
+        now = now or pd.Timestamp.now(tz=MARKET_TZ)
+        hour, minute = (int(part) for part in self.run_after.split(':'))
+        run_time = now.normalize() + pd.Timedelta(hours=hour, minutes=minute)
+        if run_time <= now:
+            run_time += pd.Timedelta(days=1)
+        return run_time
+
+    def run_forever(self):
+        """常驻运行：每天收盘后执行一次预计算"""
+        while True:
+            run_time = self.next_run_time()
+            wait = (run_time - pd.Timestamp.now(tz=MARKET_TZ)).total_seconds()
+            logging.info(f"下一次预计算时间: {run_time:%Y-%m-%d %H:%M %Z}")
+            time.sleep(max(0, wait))
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"预计算运行失败: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预计算市场宽度缓存")
+    parser.add_argument("--once", action="store_true", help="立即执行一次后退出")
+    parser.add_argument("--config", default="config/config.yaml", help="配置文件路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    scheduler = PrecomputeScheduler(DataFetcher(args.config))
+    if args.once:
+        scheduler.run_once()
+    else:
+        scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
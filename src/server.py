@@ -0,0 +1,240 @@
+"""只读HTTP查询服务：从 DataStorage 缓存提供市场宽度、多头排列和指数行情
+
+    python -m src.server --port 8765
+
+    GET /breadth?index=SP500&ma=21&sample_size=30&lookback=365
+    GET /bullish?index=SP500&sample_size=30&lookback=365&columns=breadth,bullish_count
+    GET /index?index=SP500&lookback=365&start=2024-01-01&end=2024-06-30
+    GET /breadth?...&since=2024-06-28      只返回该日期之后的新行
+    GET /health
+
+数据只读不计算（由预计算任务写入缓存）。数据表常驻内存，缓存文件的修改时间或大小
+变化时重新读取；响应带 ETag，客户端用 If-None-Match 轮询时文件未变化直接返回 304。
+"""
+import argparse
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from .cli import load_config
+from .data.data_storage import DataStorage, DEFAULT_UNIVERSE
+from .data.frame_cache import FrameCache
+from .instrumentation import count
+
+class QueryError(Exception):
+    """请求参数错误或数据不存在，status 为HTTP状态码"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class BreadthQueryService:
+    """按查询参数读取缓存数据表，处理投影、日期区间和增量查询
+
+    数据表按 (数据集, 参数) 保存在 FrameCache 中，元数据记录读取时的文件版本；
+    每次请求只对缓存文件做一次 stat，版本不变时直接使用内存中的数据表。
+    序列化后的响应按 ETag 再缓存一份，相同的轮询请求不需要重新序列化。
+    """
+
+    def __init__(self, storage: DataStorage = None, config: Dict = None, max_bytes: int = 256 * 1024 * 1024,
+                 max_responses: int = 256):
+        self.storage = storage or DataStorage()
+        self.config = config or {}
+        self.frames = FrameCache(max_bytes=max_bytes, ttl_seconds=float('inf'))
+        self.max_responses = max_responses
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _int_param(params: Dict, name: str, default: int) -> int:
+        try:
+            return int(params.get(name, default))
+        except ValueError:
+            raise QueryError(400, f"参数 {name} 必须是整数")
+
+    @staticmethod
+    def _date_param(params: Dict, name: str) -> Optional[pd.Timestamp]:
+        if not params.get(name):
+            return None
+        try:
+            return pd.Timestamp(params[name])
+        except ValueError:
+            raise QueryError(400, f"参数 {name} 不是有效日期")
+
+    def _index_symbol(self, index_name: str) -> str:
+        return self.config.get('indices', {}).get(index_name, {}).get('symbol', "^GSPC")
+
+    def _dataset(self, dataset: str, params: Dict) -> Tuple[tuple, Optional[tuple], Callable]:
+        """解析数据集参数，返回 (缓存键, 文件版本, 读取函数)"""
+        index_name = params.get('index', DEFAULT_UNIVERSE)
+        lookback_days = self._int_param(params, 'lookback', 365)
+        if dataset == 'breadth':
+            ma_period = self._int_param(params, 'ma', 21)
+            sample_size = self._int_param(params, 'sample_size', 30)
+            key = (dataset, index_name, ma_period, sample_size, lookback_days)
+            version = self.storage.data_version(ma_period, sample_size, lookback_days, index_name)
+            return key, version, lambda: self.storage.load_data(ma_period, sample_size, lookback_days,
+                                                                max_age_hours=None, universe=index_name)
+        if dataset == 'bullish':
+            sample_size = self._int_param(params, 'sample_size', 30)
+            key = (dataset, index_name, sample_size, lookback_days)
+            version = self.storage.bullish_data_version(sample_size, lookback_days, index_name)
+            return key, version, lambda: self.storage.load_bullish_data(sample_size, lookback_days,
+                                                                        max_age_hours=None, universe=index_name)
+        if dataset == 'index':
+            symbol = self._index_symbol(index_name)
+            key = (dataset, symbol, lookback_days)
+            version = self.storage.index_data_version(symbol, lookback_days)
+
+            def load_index():
+                df = self.storage.load_index_data(symbol, lookback_days, max_age_hours=None)
+                return df.rename_axis('date').reset_index() if df is not None else None
+            return key, version, load_index
+        raise QueryError(404, f"未知数据集: {dataset}")
+
+    def _frame(self, key: tuple, version: tuple, load: Callable) -> pd.DataFrame:
+        """返回内存中的数据表，文件版本变化时重新读取"""
+        entry = self.frames.peek(key)
+        if entry is not None and entry.meta.get('version') == version:
+            return entry.frame
+        df = load()
+        if df is None:
+            raise QueryError(404, "缓存中没有该数据，请先运行预计算")
+        count('service_reload')
+        self.frames.put(key, df, {'version': version})
+        return df
+
+    @staticmethod
+    def make_etag(key: tuple, version: tuple, params: Dict) -> str:
+        query = json.dumps([list(key), list(version), sorted(params.items())], default=str)
+        return '"' + hashlib.sha1(query.encode('utf-8')).hexdigest()[:20] + '"'
+
+    def _project(self, df: pd.DataFrame, params: Dict) -> pd.DataFrame:
+        """按 start/end/since 筛选日期，按 columns 选择列（date 列始终保留）"""
+        start, end, since = (self._date_param(params, name) for name in ('start', 'end', 'since'))
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= df['date'] >= start
+        if end is not None:
+            mask &= df['date'] <= end
+        if since is not None:
+            mask &= df['date'] > since
+
+        columns = list(df.columns)
+        if params.get('columns'):
+            requested = [column.strip() for column in params['columns'].split(',') if column.strip()]
+            unknown = [column for column in requested if column not in df.columns]
+            if unknown:
+                raise QueryError(400, f"未知的列: {', '.join(unknown)}")
+            columns = ['date'] + [column for column in requested if column != 'date']
+        return df.loc[mask.to_numpy(), columns]
+
+    def query(self, dataset: str, params: Dict, if_none_match: str = None) -> Tuple[int, str, Optional[bytes]]:
+        """执行查询，返回 (状态码, ETag, 响应体)；ETag 与 If-None-Match 相同时响应体为None（304）"""
+        key, version, load = self._dataset(dataset, params)
+        if version is None:
+            raise QueryError(404, "缓存中没有该数据，请先运行预计算")
+
+        etag = self.make_etag(key, version, params)
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            count('service_not_modified')
+            return 304, etag, None
+
+        with self._lock:
+            body = self._responses.get(etag)
+            if body is not None:
+                self._responses.move_to_end(etag)
+        if body is None:
+            df = self._project(self._frame(key, version, load), params)
+            payload = {
+                'dataset': dataset,
+                'rows': len(df),
+                'last_date': df['date'].max().strftime('%Y-%m-%d') if len(df) else params.get('since'),
+                'columns': list(df.columns),
+                'data': json.loads(df.assign(date=df['date'].dt.strftime('%Y-%m-%d')).to_json(orient='values'))
+            }
+            body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            with self._lock:
+                self._responses[etag] = body
+                while len(self._responses) > self.max_responses:
+                    self._responses.popitem(last=False)
+        return 200, etag, body
+
+    def health(self) -> Dict:
+        return {'status': 'ok', 'frames': self.frames.stats(), 'responses': len(self._responses)}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """把 GET 请求交给服务器上的 BreadthQueryService"""
+
+    server_version = "MarketBreadth/1.0"
+
+    def _send(self, status: int, body: Optional[bytes], etag: str = None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if body is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path = url.path.strip('/')
+        try:
+            if path == 'health':
+                body = json.dumps(self.server.service.health(), ensure_ascii=False).encode('utf-8')
+                return self._send(200, body)
+            status, etag, body = self.server.service.query(path, params, self.headers.get('If-None-Match'))
+            self._send(status, body, etag)
+        except QueryError as e:
+            self._send(e.status, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'))
+        except Exception as e:
+            logging.error(f"处理请求 {self.path} 失败: {e}")
+            self._send(500, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def create_server(host: str, port: int, service: BreadthQueryService) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="市场宽度只读HTTP查询服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--cache-dir", default="cache", help="DataStorage 缓存目录")
+    parser.add_argument("--config", default="config/config.yaml", help="配置文件路径（用于指数代码）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config(args.config)
+    server = create_server(args.host, args.port, BreadthQueryService(DataStorage(args.cache_dir), config))
+    logging.info(f"查询服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from src.data.backends import MARKET_TZ
+from src.data.data_fetcher import DataFetcher
+from src.data.price_store import PriceStore
+
+
+class RecordingBackend:
+    """按请求区间生成工作日K线，并记录每次请求"""
+
+    def __init__(self):
+        self.requests = []
+
+    def history(self, symbol, start, end):
+        self.requests.append((symbol, pd.Timestamp(start), pd.Timestamp(end)))
+        index = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), tz=MARKET_TZ)
+        prices = np.arange(len(index), dtype=float) + 100
+        return pd.DataFrame({'Open': prices, 'High': prices, 'Low': prices,
+                             'Close': prices, 'Volume': 1000.0}, index=index)
+
+
+def test_fetched_history_persisted_to_price_store(tmp_path):
+    store = PriceStore(str(tmp_path))
+    backend = RecordingBackend()
+    first = DataFetcher(backend=backend, price_store=store).get_stock_data('AAA', period=30)
+
+    assert store.has('AAA')
+    assert len(store.read('AAA')) == len(first)
+
+    # 新进程内存缓存为空：从价格库读取历史，只补齐最后一根K线之后的数据
+    backend.requests.clear()
+    second = DataFetcher(backend=backend, price_store=store).get_stock_data('AAA', period=30)
+
+    assert len(backend.requests) == 1
+    _, start, _ = backend.requests[0]
+    assert start == first.index.max()
+    assert second.index.equals(first.index)
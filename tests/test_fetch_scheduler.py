@@ -0,0 +1,39 @@
+import random
+import time
+
+from src.data.fetch_scheduler import FetchScheduler, ThrottledError
+
+
+def test_throttled_batch_recovers_rate():
+    """30%的请求被限流时，速率应在限流后恢复，而不是一直停留在下限附近"""
+    rng = random.Random(1)
+
+    def request(item):
+        if rng.random() < 0.3:
+            raise ThrottledError("429 Too Many Requests")
+        return item
+
+    scheduler = FetchScheduler(rate_limit=20, burst=5, max_concurrency=8, initial_concurrency=4,
+                               max_retries=5, backoff_base=0.05, backoff_max=1.0)
+    try:
+        started = time.monotonic()
+        results = scheduler.map(lambda item: scheduler.call(request, item), list(range(71)))
+        elapsed = time.monotonic() - started
+    finally:
+        scheduler.shutdown()
+
+    assert all(results[item] == item for item in range(71))
+    assert scheduler.stats['throttled'] > 0
+    # 不限流时约 (71 + 重试) / 20 秒；速率停在下限 20/16 时需要一分钟以上
+    assert elapsed < 15
+    assert scheduler.bucket.rate > scheduler.min_rate * 2
+
+
+def test_concurrent_throttles_halve_rate_once():
+    scheduler = FetchScheduler(rate_limit=16, throttle_cooldown=10)
+    try:
+        for _ in range(4):
+            scheduler._on_failure(throttled=True)
+        assert scheduler.bucket.rate == 8
+    finally:
+        scheduler.shutdown()
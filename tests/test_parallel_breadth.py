@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import INDEX_SYMBOL, generate_universe
+from src.analysis.breadth_engine import BreadthEngine
+from src.analysis.parallel_breadth import ShardedBreadth
+
+
+@pytest.fixture(scope="module")
+def engine():
+    stocks_data = generate_universe(40, 300, seed=7, late_listing=0.2)
+    stocks_data.pop(INDEX_SYMBOL)
+    engine = BreadthEngine.from_stock_data(stocks_data)
+    # 最后一个分片的股票没有任何行情，该分片的计数全部为0
+    engine.closes.iloc[:, -10:] = np.nan
+    return engine
+
+
+@pytest.fixture(scope="module")
+def dates():
+    return pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=250)
+
+
+@pytest.fixture(scope="module")
+def sharded():
+    sharded = ShardedBreadth(workers=4, min_symbols=1)
+    yield sharded
+    sharded.shutdown()
+
+
+def test_sharding_enabled(engine, sharded):
+    assert sharded.enabled_for(engine)
+    assert not ShardedBreadth(workers=1, min_symbols=1).enabled_for(engine)
+
+
+def test_breadth_matches_serial(engine, dates, sharded):
+    serial = ShardedBreadth(workers=1).breadth(engine, 21, dates)
+    pd.testing.assert_frame_equal(sharded.breadth(engine, 21, dates), serial)
+
+
+def test_signal_matrices_match_serial(engine, dates, sharded):
+    serial_above, serial_valid = ShardedBreadth(workers=1).signal_matrices(engine, 63, dates)
+    above, valid = sharded.signal_matrices(engine, 63, dates)
+    pd.testing.assert_frame_equal(above, serial_above)
+    pd.testing.assert_frame_equal(valid, serial_valid)
+
+
+def test_breadth_by_universe_matches_serial(engine, dates, sharded):
+    symbols = list(engine.closes.columns)
+    universes = {'A': symbols[:25], 'B': symbols[15:]}
+    serial = ShardedBreadth(workers=1).breadth_by_universe(engine, 21, dates, universes)
+    parallel = sharded.breadth_by_universe(engine, 21, dates, universes)
+    for name in universes:
+        pd.testing.assert_frame_equal(parallel[name], serial[name])
+
+
+def test_bullish_alignment_matches_serial(engine, dates, sharded):
+    serial = ShardedBreadth(workers=1).bullish_alignment(engine, dates)
+    parallel = sharded.bullish_alignment(engine, dates)
+    pd.testing.assert_frame_equal(parallel, serial)
+    assert parallel['bullish_count'].sum() > 0
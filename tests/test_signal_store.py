@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from src.data.signal_store import SignalStore
+
+
+def make_signals(symbols, dates, seed):
+    rng = np.random.default_rng(seed)
+    valid = pd.DataFrame(rng.random((len(dates), len(symbols))) < 0.9, index=dates, columns=symbols)
+    above = valid & (rng.random((len(dates), len(symbols))) < 0.5)
+    return above, valid
+
+
+def expected_counts(above, valid, symbols, dates):
+    return (above.loc[dates, symbols].sum(axis=1).to_numpy(), valid.loc[dates, symbols].sum(axis=1).to_numpy())
+
+
+def test_small_write_merges_into_large_matrix(tmp_path):
+    store = SignalStore(str(tmp_path))
+    symbols = [f"S{i:03d}" for i in range(120)]
+    dates = pd.bdate_range('2024-01-01', periods=400)
+    above, valid = make_signals(symbols, dates, seed=0)
+    store.write('SP500', 21, above, valid, replace=True)
+
+    # 小样本、短回溯期的计算晚一个交易日，包含一只新股票
+    small_symbols = symbols[:30] + ['NEW']
+    small_dates = pd.bdate_range(dates[-99], periods=100)
+    small_above, small_valid = make_signals(small_symbols, small_dates, seed=1)
+    assert store.write('SP500', 21, small_above, small_valid, replace=False)
+
+    assert store.symbols('SP500', 21) == symbols + ['NEW']
+
+    # 刷新过的股票在新日期上使用新数据
+    counts = store.counts('SP500', 21, small_symbols, small_dates)
+    np.testing.assert_array_equal(counts, expected_counts(small_above, small_valid, small_symbols, small_dates))
+
+    # 未刷新的股票没有计算到新日期，包含它们的查询视为未命中
+    assert store.counts('SP500', 21, symbols, small_dates) is None
+
+    # 原有日期上，重叠的格子以新数据为准，其余保留原矩阵
+    merged_above, merged_valid = above.copy(), valid.copy()
+    overlap = small_dates[:-1]
+    merged_above.loc[overlap, symbols[:30]] = small_above.loc[overlap, symbols[:30]]
+    merged_valid.loc[overlap, symbols[:30]] = small_valid.loc[overlap, symbols[:30]]
+    counts = store.counts('SP500', 21, symbols, dates)
+    np.testing.assert_array_equal(counts, expected_counts(merged_above, merged_valid, symbols, dates))
+
+    # 新股票只覆盖自己的计算区间
+    assert store.counts('SP500', 21, ['NEW'], dates[-150:-100]) is None
+
+
+def test_replace_drops_previous_matrix(tmp_path):
+    store = SignalStore(str(tmp_path))
+    dates = pd.bdate_range('2024-01-01', periods=50)
+    store.write('SP500', 21, *make_signals(['A', 'B'], dates, seed=0), replace=True)
+    store.write('SP500', 21, *make_signals(['C'], dates, seed=1), replace=True)
+    assert store.symbols('SP500', 21) == ['C']
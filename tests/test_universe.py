@@ -0,0 +1,53 @@
+import pandas as pd
+
+from src.data.universe import UniverseManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_table(symbols):
+    return pd.DataFrame({
+        'symbol': symbols,
+        'name': symbols,
+        'sector': 'Tech',
+        'added': pd.NaT,
+        'removed': pd.NaT
+    })
+
+
+def test_table_reloaded_after_refresh_hours(tmp_path):
+    clock = FakeClock()
+    manager = UniverseManager({}, cache_dir=str(tmp_path), refresh_hours=24, clock=clock)
+    downloads = []
+    manager._download = lambda index_name: downloads.append(index_name) or make_table(['AAA', 'BBB'])
+
+    assert manager.get_members('SP500') == ['AAA', 'BBB']
+    assert len(downloads) == 1
+
+    # 另一个进程（例如预计算）更新了本地表
+    manager.storage.save_frame(make_table(['AAA', 'BBB', 'CCC']), 'SP500', {"index": 'SP500', "count": 3})
+    clock.now += 23 * 3600
+    assert manager.get_members('SP500') == ['AAA', 'BBB']
+
+    clock.now += 2 * 3600
+    assert manager.get_members('SP500') == ['AAA', 'BBB', 'CCC']
+    assert len(downloads) == 1
+
+
+def test_empty_table_retried(tmp_path):
+    manager = UniverseManager({}, cache_dir=str(tmp_path), refresh_hours=24, clock=FakeClock())
+
+    def offline(index_name):
+        raise ConnectionError("offline")
+
+    manager._download = offline
+    assert manager.get_members('SP500') == []
+
+    manager._download = lambda index_name: make_table(['AAA'])
+    assert manager.get_members('SP500') == ['AAA']